@@ -1,19 +1,45 @@
 import os
+from editor.line_rope import LineRope
+from editor.mapped_file import MappedFile
+from editor.file_reader import LoadJob
+from editor.file_writer import SaveJob
+from editor.undo import (UndoJournal, Edit, DEFAULT_UNDO_MAX_BYTES,
+                         EDIT_INSERT, EDIT_DELETE, EDIT_SPLIT, EDIT_JOIN,
+                         EDIT_INSERT_LINES, EDIT_DELETE_LINES, EDIT_SET_LINE)
+
+# Storage engines for Buffer.lines
+STORAGE_LIST = "list" # Plain list of str, O(n) line inserts/deletes
+STORAGE_ROPE = "rope" # LineRope, O(log n) edits for very large files
+
+# Files at least this big are memory-mapped and decoded lazily (rope storage only)
+LAZY_LOAD_MIN_BYTES = 16 * 1024 * 1024
 
 class Buffer:
-    def __init__(self, initial_content=None, filepath=None):
-        self.lines = [""]
+    def __init__(self, initial_content=None, filepath=None, storage=STORAGE_LIST,
+                 undo_max_bytes=DEFAULT_UNDO_MAX_BYTES):
+        self.storage = storage
+        self.journal = UndoJournal(undo_max_bytes)
+        self.lines = self._make_lines([""])
         self.filepath = filepath
         self.dirty = False
+        self.version = 0 # Bumped on every edit
+        self.mapped_file = None # MappedFile backing self.lines after a lazy load
+        self._synced_index_lines = 0 # Lines of mapped_file already appended to self.lines
+        self._changed_from = None # First line changed since take_changed_lines(), None if nothing was
+        self._unchanged_tail = 0  # Lines at the end of the buffer untouched since then
 
         if filepath:
             self.load_from_file(filepath)
         elif initial_content:
-            self.lines = initial_content.splitlines()
-            if not self.lines:
-                self.lines = [""]
+            self.lines = self._make_lines(initial_content.splitlines() or [""])
             self._mark_dirty() # Needs saving
 
+    def _make_lines(self, lines):
+        """Wraps a list of line strings in the configured storage engine."""
+        if self.storage == STORAGE_ROPE:
+            return LineRope(lines)
+        return list(lines)
+
     def get_line(self, line_num):
         if 0 <= line_num < len(self.lines):
             return self.lines[line_num]
@@ -24,25 +50,58 @@ class Buffer:
     
     def _mark_dirty(self):
         """Helper method for marking buffer needs saving"""
+        self.version += 1
         if not self.dirty:
             self.dirty = True
 
+    def _lines_changed(self, line_num, line_count):
+        """Notes that lines [line_num, line_num + line_count) hold new text (line_count 0 for a deletion)."""
+        tail = len(self.lines) - (line_num + line_count)
+        if self._changed_from is None:
+            self._changed_from, self._unchanged_tail = line_num, tail
+        else:
+            self._changed_from = min(self._changed_from, line_num)
+            self._unchanged_tail = min(self._unchanged_tail, tail)
+
+    def take_changed_lines(self):
+        """
+        Returns (first_changed_line, unchanged_tail_lines) covering every edit since the
+        last call, or None if there were none. Lines before the first and the last
+        unchanged_tail_lines lines are the same as before (the tail may have moved).
+        """
+        if self._changed_from is None:
+            return None
+        changed = (self._changed_from, self._unchanged_tail)
+        self._changed_from = None
+        return changed
+
+    def _record(self, kind, line_num, col=0, payload=None):
+        self.journal.record(Edit(kind, line_num, col, payload))
+
     def insert_char(self, line_num, col, char):
         if 0 <= line_num < len(self.lines):
             line = self.lines[line_num]
+            col = min(col, len(line))
             self.lines[line_num] = line[:col] + char + line[col:]
+            self._record(EDIT_INSERT, line_num, col, char)
+            self._lines_changed(line_num, 1)
             self._mark_dirty()
 
     def delete_char(self, line_num, col):
         """Deletes the character before (line_num, col), returns true if deleted anything"""
         if 0 <= line_num < len(self.lines):
             line = self.lines[line_num]
+            col = min(col, len(line))
             if col > 0 and len(line) > 0:
                 self.lines[line_num] = line[:col-1] + line[col:]
+                self._record(EDIT_DELETE, line_num, col - 1, line[col-1])
+                self._lines_changed(line_num, 1)
                 self._mark_dirty()
                 return True # Deletion occurred
             elif col == 0 and line_num > 0: # Backspace at start of line
+                self._record(EDIT_JOIN, line_num - 1, len(self.lines[line_num - 1]))
                 self.lines[line_num-1] += self.lines.pop(line_num)
+                self._lines_changed(line_num - 1, 1)
                 self._mark_dirty()
                 return True # Deletion occurred
         return False
@@ -53,6 +112,8 @@ class Buffer:
             line = self.lines[line_num]
             if 0 <= col < len(line):
                 self.lines[line_num] = line[:col] + line[col+1:]
+                self._record(EDIT_DELETE, line_num, col, line[col])
+                self._lines_changed(line_num, 1)
                 self._mark_dirty()
                 return True # Deletion occurred
         return False
@@ -60,56 +121,295 @@ class Buffer:
     def split_line(self, line_num, col):
         if 0 <= line_num < len(self.lines):
             line = self.lines[line_num]
+            col = min(col, len(line))
             self.lines.insert(line_num + 1, line[col:])
             self.lines[line_num] = line[:col]
+            self._record(EDIT_SPLIT, line_num, col)
+            self._lines_changed(line_num, 2)
             self._mark_dirty()
 
+    def set_line(self, line_num, text):
+        """Replaces the whole text of a line."""
+        if 0 <= line_num < len(self.lines):
+            old_text = self.lines[line_num]
+            if old_text == text:
+                return
+            self.lines[line_num] = text
+            self._record(EDIT_SET_LINE, line_num, 0, (old_text, text))
+            self._lines_changed(line_num, 1)
+            self._mark_dirty()
+
+    def insert_lines(self, line_num, new_lines):
+        """Inserts whole lines before line_num (line_num == line count appends)."""
+        line_num = max(0, min(line_num, len(self.lines)))
+        new_lines = tuple(new_lines)
+        if not new_lines:
+            return
+        for i, text in enumerate(new_lines):
+            self.lines.insert(line_num + i, text)
+        self._record(EDIT_INSERT_LINES, line_num, 0, new_lines)
+        self._lines_changed(line_num, len(new_lines))
+        self._mark_dirty()
+
+    def delete_lines(self, line_num, count):
+        """
+        Deletes up to count whole lines starting at line_num and returns them.
+        The buffer always keeps at least one (possibly empty) line.
+        """
+        count = max(0, min(count, len(self.lines) - line_num))
+        if line_num < 0 or count == 0:
+            return []
+        removed = [self.lines.pop(line_num) for _ in range(count)]
+        self._record(EDIT_DELETE_LINES, line_num, 0, tuple(removed))
+        self._lines_changed(line_num, 0)
+        if not self.lines:
+            self.lines.append("")
+            self._record(EDIT_INSERT_LINES, 0, 0, ("",))
+            self._lines_changed(0, 1)
+        self._mark_dirty()
+        return removed
+
+    def _apply_edit(self, edit):
+        """Performs an Edit without recording it (used by undo/redo)."""
+        lines = self.lines
+        line_num, col, payload = edit.line, edit.col, edit.payload
+        changed_count = 1
+        if edit.kind == EDIT_INSERT:
+            line = lines[line_num]
+            lines[line_num] = line[:col] + payload + line[col:]
+        elif edit.kind == EDIT_DELETE:
+            line = lines[line_num]
+            lines[line_num] = line[:col] + line[col + len(payload):]
+        elif edit.kind == EDIT_SPLIT:
+            line = lines[line_num]
+            lines.insert(line_num + 1, line[col:])
+            lines[line_num] = line[:col]
+            changed_count = 2
+        elif edit.kind == EDIT_JOIN:
+            lines[line_num] += lines.pop(line_num + 1)
+        elif edit.kind == EDIT_INSERT_LINES:
+            for i, text in enumerate(payload):
+                lines.insert(line_num + i, text)
+            changed_count = len(payload)
+        elif edit.kind == EDIT_DELETE_LINES:
+            for _ in payload:
+                lines.pop(line_num)
+            changed_count = 0
+        elif edit.kind == EDIT_SET_LINE:
+            lines[line_num] = payload[1]
+        self._lines_changed(line_num, changed_count)
+
+    def undo(self):
+        """Reverts the newest undo step. Returns the (line, col) it started at, or None if nothing to undo."""
+        step = self.journal.pop_undo()
+        if not step:
+            return None
+        self.journal.suspended += 1
+        try:
+            for edit in reversed(step):
+                self._apply_edit(edit.inverse())
+        finally:
+            self.journal.suspended -= 1
+        self._mark_dirty()
+        return step[0].line, step[0].col
+
+    def redo(self):
+        """Re-applies the newest undone step. Returns the (line, col) it started at, or None."""
+        step = self.journal.pop_redo()
+        if not step:
+            return None
+        self.journal.suspended += 1
+        try:
+            for edit in step:
+                self._apply_edit(edit)
+        finally:
+            self.journal.suspended -= 1
+        self._mark_dirty()
+        return step[0].line, step[0].col
+
     def get_content_as_string(self):
         return "\n".join(self.lines)
 
-    def load_from_file(self, filepath):
+    def _should_load_lazily(self, filepath):
+        if self.storage != STORAGE_ROPE:
+            return False # Only the rope can hold unloaded file spans
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                self.lines = [line.rstrip('\n\r') for line in f.readlines()]
-            if not self.lines:
-                self.lines = [""]
-            self.filepath = filepath
-            self.dirty = False
-            print(f"File '{filepath}' loaded.")
-            return True
-        except FileNotFoundError:
-            print(f"Error: File not found '{filepath}'. Creating new buffer.")
-            self.lines = [""]
-            self.filepath = filepath # Still set filepath for a potential first save
+            return os.path.getsize(filepath) >= LAZY_LOAD_MIN_BYTES
+        except OSError:
+            return False
+
+    def _load_mapped(self, filepath):
+        """Memory-maps filepath and indexes all its line offsets, decoding nothing up front."""
+        mapped_file = MappedFile(filepath)
+        mapped_file.build_index()
+        self._adopt_mapped_file(mapped_file)
+
+    def _adopt_mapped_file(self, mapped_file):
+        """Makes self.lines a view of mapped_file, releasing any previous mapping."""
+        self._release_mapped_file()
+        self.mapped_file = mapped_file
+        with mapped_file.index_lock:
+            self.lines = LineRope.from_mapped_file(mapped_file)
+            self._synced_index_lines = len(self.lines)
+
+    def sync_index(self):
+        """Appends lines found by background indexing since the last call. Returns True if any were added."""
+        if not self.mapped_file or self._synced_index_lines >= self.mapped_file.line_count:
+            return False
+        with self.mapped_file.index_lock:
+            new_line_count = self.mapped_file.line_count
+            self.lines.extend_from_mapped_file(self.mapped_file, self._synced_index_lines,
+                                               new_line_count - self._synced_index_lines)
+            self._lines_changed(self._synced_index_lines, new_line_count - self._synced_index_lines)
+            self._synced_index_lines = new_line_count
+        return True
+
+    def finish_indexing(self):
+        """Blocks until a lazily loaded file is fully indexed and every line is in the buffer."""
+        if self.mapped_file:
+            self.mapped_file.wait_for_index()
+            self.sync_index()
+
+    def indexing_progress(self):
+        """Fraction of a lazily loaded file indexed so far, or None if there's nothing left to index."""
+        if not self.mapped_file:
+            return None
+        if self.mapped_file.index_complete and self._synced_index_lines >= self.mapped_file.line_count:
+            return None
+        return self.mapped_file.index_progress
+
+    def _release_mapped_file(self):
+        if self.mapped_file:
+            self.mapped_file.close()
+            self.mapped_file = None
+
+    def _is_mapped_path(self, filepath):
+        return self.mapped_file is not None and \
+            os.path.abspath(filepath) == os.path.abspath(self.mapped_file.filepath)
+
+    def begin_load(self, filepath, lazy=None):
+        """
+        Returns a LoadJob for filepath. job.run() reads the file and can run on a worker
+        thread, complete_load(job) then swaps the result in from the main thread.
+        With lazy=True (the default for big files when using rope storage) the file is
+        memory-mapped and lines are decoded on demand.
+        """
+        if lazy is None:
+            lazy = self._should_load_lazily(filepath)
+        return LoadJob(filepath, self._make_lines, lazy)
+
+    def complete_load(self, job):
+        """Replaces the buffer's contents with a finished LoadJob. Returns True if the file was loaded."""
+        if job.not_found:
+            print(f"Error: File not found '{job.filepath}'. Creating new buffer.")
+            self._release_mapped_file()
+            self.lines = self._make_lines([""])
+            self.filepath = job.filepath # Still set filepath for a potential first save
             self.dirty = False
+            self.version += 1
+            self.journal.clear()
+            self._lines_changed(0, len(self.lines))
             return False
-        except Exception as e:
-            print(f"Error loading file '{filepath}': {e}")
-            # self.lines = ["Error loading file."]
-            # self.filepath = None
-            # self.dirty = False
+        if job.error is not None:
+            print(f"Error loading file '{job.filepath}': {job.error}")
             return False
-        
-    def save_to_file(self, filepath=None):
+
+        if job.mapped_file:
+            self._adopt_mapped_file(job.mapped_file)
+            job.mapped_file.start_background_indexing()
+        else:
+            self._release_mapped_file()
+            self.lines = job.lines
+        self.filepath = job.filepath
+        self.dirty = False
+        self.version += 1
+        self.journal.clear()
+        self._lines_changed(0, len(self.lines))
+        print(f"File '{job.filepath}' loaded.")
+        return True
+
+    def load_from_file(self, filepath, lazy=None):
+        """Loads filepath into the buffer synchronously."""
+        job = self.begin_load(filepath, lazy)
+        job.run()
+        return self.complete_load(job)
+
+    def begin_save(self, filepath=None):
+        """
+        Snapshots the buffer for saving and returns a SaveJob, or None if there's no path.
+        Only the snapshot happens here; job.run() does the I/O and can run on a worker
+        thread, after which complete_save(job) must be called from the main thread.
+        """
         target_path = filepath if filepath else self.filepath
         if not target_path:
             print("Error: No filepath specified for saving.")
+            return None
+        # Lines indexed so far are saved from the buffer. The rest of the file isn't in the buffer
+        # yet, so it can't have been edited: the save copies it as is, without waiting for the index.
+        self.sync_index()
+        tail = None
+        if self.mapped_file:
+            with self.mapped_file.index_lock:
+                if self.mapped_file.offsets[self._synced_index_lines] < self.mapped_file.size:
+                    tail = (self.mapped_file, self._synced_index_lines, None)
+
+        if len(self.lines) == 1 and not self.lines[0] and tail is None:
+            pieces = [] # A lone empty line is saved as an empty file
+        elif self.storage == STORAGE_ROPE:
+            pieces = self.lines.snapshot()
+        else:
+            pieces = [list(self.lines)]
+        if tail is not None:
+            pieces.append(tail)
+        newline = self.mapped_file.newline if self.mapped_file else os.linesep
+        # Renaming over a file that's still mapped fails on Windows, complete_save does it
+        return SaveJob(target_path, pieces, newline, version=self.version,
+                       defer_replace=self._is_mapped_path(target_path))
+
+    def complete_save(self, job):
+        """Finishes a SaveJob after job.run() has returned. Returns True if the file was saved."""
+        if job.error is None and job.defer_replace:
+            try:
+                self._replace_mapped_file(job)
+            except Exception as e:
+                job.error = e
+                job.discard()
+        if job.error is not None:
+            print(f"Error saving file '{job.target_path}': {job.error}")
             return False
+
+        self.filepath = job.target_path
+        if self.version == job.version: # Edits made while saving still need a save
+            self.dirty = False
+        print(f"File saved to '{job.target_path}'.")
+        return True
+
+    def _replace_mapped_file(self, job):
+        """Renames a finished save over the file self.lines is mapped from, then maps the new file."""
+        unchanged_since_snapshot = self.version == job.version
         try:
-            # Ensure directory exists
-            dir_name = os.path.dirname(target_path)
-            if dir_name and not os.path.exists(dir_name):
-                os.makedirs(dir_name)
+            job.replace() # POSIX lets the old mapping live on after the rename
+        except PermissionError:
+            if not unchanged_since_snapshot:
+                raise # Remapping would lose the newer edits
+            old_path = self.mapped_file.filepath
+            self._release_mapped_file()
+            try:
+                job.replace()
+            except Exception:
+                self._load_mapped(old_path) # Still the old content, map it again
+                raise
 
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(self.get_content_as_string())
-                if self.lines and (self.lines[-1] or len(self.lines) > 1):
-                     f.write('\n')
+        if unchanged_since_snapshot:
+            # The new file holds exactly this buffer, view it instead (also compacts the rope)
+            mapped_file = MappedFile(job.target_path)
+            mapped_file.adopt_index(job.offsets)
+            self._adopt_mapped_file(mapped_file)
 
-            self.filepath = target_path
-            self.dirty = False
-            print(f"File saved to '{target_path}'.")
-            return True
-        except Exception as e:
-            print(f"Error saving file '{target_path}': {e}")
-            return False
\ No newline at end of file
+    def save_to_file(self, filepath=None):
+        """Saves synchronously, streaming to a temp file that atomically replaces the target."""
+        job = self.begin_save(filepath)
+        if job is None:
+            return False
+        job.run()
+        return self.complete_save(job)
@@ -0,0 +1,46 @@
+from editor.mapped_file import MappedFile
+
+# Indexed up front on a lazy load so the first screen shows before background indexing ends
+FIRST_SCREEN_INDEX_BYTES = 256 * 1024
+
+
+class LoadJob:
+    """
+    Reads a file for Buffer without touching the buffer itself, so run() may be
+    called from a worker thread. Buffer.complete_load(job) swaps the result in.
+
+    A lazy load memory-maps the file and indexes just its first screen; the
+    rest is indexed in the background once the buffer adopts the mapping.
+    """
+
+    def __init__(self, filepath, make_lines, lazy=False):
+        self.filepath = filepath
+        self.make_lines = make_lines # Wraps a list of str in the buffer's storage engine
+        self.lazy = lazy
+
+        self.lines = None
+        self.mapped_file = None
+        self.not_found = False
+        self.error = None
+        self.done = False
+
+    def run(self):
+        mapped_file = None
+        try:
+            if self.lazy:
+                mapped_file = MappedFile(self.filepath)
+                while not mapped_file.index_next_chunk(FIRST_SCREEN_INDEX_BYTES) and mapped_file.line_count == 0:
+                    pass # A single huge first line needs more than one step
+                self.mapped_file = mapped_file
+            else:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    self.lines = self.make_lines([line.rstrip('\n\r') for line in f.readlines()] or [""])
+        except FileNotFoundError:
+            self.not_found = True
+        except Exception as e:
+            self.error = e
+            if mapped_file:
+                mapped_file.close()
+                self.mapped_file = None
+        self.done = True
+        return self.error is None and not self.not_found
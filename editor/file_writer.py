@@ -0,0 +1,157 @@
+import os
+from array import array
+from itertools import accumulate
+
+# Encoded lines are buffered up to this size before each write call
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+
+class SaveJob:
+    """
+    Streams a snapshot of a buffer into a temp file next to the target, then renames it
+    over the target. run() does all the file I/O and may be called from a worker thread.
+
+    pieces is a list whose items are either a list of line strings or a
+    (MappedFile, start_line, line_count) tuple; the latter are copied byte for byte
+    from the mapped file without being decoded. A line_count of None stands for the
+    rest of the file from start_line on, including lines it hasn't indexed yet.
+    """
+
+    def __init__(self, target_path, pieces, newline="\n", version=0, defer_replace=False):
+        self.target_path = target_path
+        self.pieces = pieces
+        self.newline = newline.encode('ascii')
+        self.version = version # Buffer.version when the snapshot was taken
+        # Leave the final rename to the caller, e.g. when the target is memory-mapped
+        self.defer_replace = defer_replace
+
+        self.temp_path = None
+        self.offsets = None # Line start offsets of the written file, built when defer_replace is set
+        self.bytes_written = 0
+        self.error = None
+        self.done = False
+
+    def run(self):
+        """Writes the temp file, fsyncs it and (unless deferred) renames it into place."""
+        try:
+            self._write_temp_file()
+            if not self.defer_replace:
+                self.replace()
+        except Exception as e:
+            self.error = e
+            self.discard()
+        self.done = True
+        return self.error is None
+
+    def _write_temp_file(self):
+        import tempfile # Only needed once something is saved, it's slow to import at startup
+        target_dir = os.path.dirname(os.path.abspath(self.target_path))
+        os.makedirs(target_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.target_path)}.",
+                                              suffix=".tmp", dir=target_dir)
+        newline = self.newline
+        offsets = array('q', [0]) if self.defer_replace else None
+        pos = 0
+
+        with os.fdopen(fd, 'wb') as f:
+            pending = []
+            pending_bytes = 0
+            for piece in self.pieces:
+                if isinstance(piece, tuple):
+                    if pending:
+                        f.write(b"".join(pending))
+                        pending, pending_bytes = [], 0
+                    if piece[2] is None:
+                        pos = self._copy_tail(f, piece, pos, offsets)
+                    else:
+                        pos = self._copy_span(f, piece, pos, offsets)
+                    continue
+
+                for line in piece:
+                    encoded = line.encode('utf-8')
+                    pending.append(encoded)
+                    pending.append(newline)
+                    pending_bytes += len(encoded) + len(newline)
+                    pos += len(encoded) + len(newline)
+                    if offsets is not None:
+                        offsets.append(pos)
+                    if pending_bytes >= WRITE_CHUNK_BYTES:
+                        f.write(b"".join(pending))
+                        pending, pending_bytes = [], 0
+
+            if pending:
+                f.write(b"".join(pending))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.bytes_written = pos
+        self.offsets = offsets
+
+    def _copy_span(self, f, span, pos, offsets):
+        """Copies unedited lines straight from the mapped file."""
+        source, start, count = span
+        if count <= 0:
+            return pos
+        begin, end = source.offsets[start], source.offsets[start + count]
+        for chunk_start in range(begin, end, WRITE_CHUNK_BYTES):
+            f.write(source.mm[chunk_start:min(end, chunk_start + WRITE_CHUNK_BYTES)])
+
+        if offsets is not None:
+            offsets.extend(map((pos - begin).__add__, source.offsets[start + 1:start + count + 1]))
+        pos += end - begin
+
+        # The file's last line may have no terminator, every saved line gets one
+        if start + count == source.line_count and not source.ends_with_newline and end > begin:
+            f.write(self.newline)
+            pos += len(self.newline)
+            if offsets is not None:
+                offsets[-1] = pos
+        return pos
+
+    def _copy_tail(self, f, tail, pos, offsets):
+        """Copies a mapped file from a line to its end, finding the line offsets of the copy as it goes."""
+        source, start, _ = tail
+        begin, end = source.offsets[start], source.size
+        last_byte = b""
+        for chunk_start in range(begin, end, WRITE_CHUNK_BYTES):
+            chunk = source.mm[chunk_start:min(end, chunk_start + WRITE_CHUNK_BYTES)]
+            f.write(chunk)
+            if offsets is not None:
+                # Every '\n' ends a line, as in MappedFile.index_next_chunk
+                line_lengths = map((1).__add__, map(len, chunk.split(b'\n')[:-1]))
+                starts = accumulate(line_lengths, initial=pos + chunk_start - begin)
+                next(starts)
+                offsets.extend(starts)
+            last_byte = chunk[-1:]
+        pos += end - begin
+
+        # The file's last line may have no terminator, every saved line gets one
+        if end > begin and last_byte != b'\n':
+            f.write(self.newline)
+            pos += len(self.newline)
+            if offsets is not None:
+                offsets.append(pos)
+        return pos
+
+    def replace(self):
+        """Renames the finished temp file over the target and syncs the directory entry."""
+        if os.path.exists(self.target_path):
+            import shutil
+            shutil.copymode(self.target_path, self.temp_path)
+        os.replace(self.temp_path, self.target_path)
+        self.temp_path = None
+        if hasattr(os, 'O_DIRECTORY'): # POSIX only, Windows can't open directories
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.target_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def discard(self):
+        """Removes a temp file that won't be renamed into place."""
+        if self.temp_path and os.path.exists(self.temp_path):
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+        self.temp_path = None
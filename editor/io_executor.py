@@ -0,0 +1,46 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IOExecutor:
+    """
+    Runs file I/O off the pygame event loop. Work runs on a worker thread;
+    its on_done callback is queued and only runs when the main loop calls poll(),
+    so callbacks are free to touch the buffer, editor state and renderer.
+
+    One worker by default, so saves and loads finish in the order they were submitted.
+    """
+
+    def __init__(self, max_workers=1):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="editor-io")
+        self._completed = queue.SimpleQueue()
+        self.pending = 0
+
+    @property
+    def busy(self):
+        return self.pending > 0
+
+    def submit(self, work, on_done=None):
+        """Runs work() on the worker thread, then on_done(future) on the next poll()."""
+        self.pending += 1
+        future = self._pool.submit(work)
+        future.add_done_callback(lambda f: self._completed.put((f, on_done)))
+        return future
+
+    def poll(self):
+        """Runs callbacks of finished work. Call from the main thread. Returns how many ran."""
+        ran = 0
+        while True:
+            try:
+                future, on_done = self._completed.get_nowait()
+            except queue.Empty:
+                return ran
+            self.pending -= 1
+            ran += 1
+            if on_done:
+                on_done(future)
+
+    def shutdown(self):
+        """Waits for outstanding work, e.g. a save issued right before quitting, and runs its callbacks."""
+        self._pool.shutdown(wait=True)
+        self.poll()
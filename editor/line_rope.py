@@ -0,0 +1,421 @@
+import random
+from bisect import bisect_right
+
+# Lines per leaf chunk. Chunks are split once they grow past MAX_CHUNK_LINES,
+# so any single edit only ever touches one small Python list.
+CHUNK_LINES = 64
+MAX_CHUNK_LINES = 2 * CHUNK_LINES
+
+
+def _line_bytes(line):
+    """Size of a line as saved: UTF-8 bytes plus its '\\n'."""
+    return len(line.encode('utf-8', errors='replace')) + 1
+
+
+class _FileSpan:
+    """Unedited lines [start, start + count) of a MappedFile, decoded on access."""
+    __slots__ = ("source", "start", "count")
+
+    def __init__(self, source, start, count):
+        self.source = source
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.source.get_line(self.start + i) for i in range(*index.indices(self.count))]
+        return self.source.get_line(self.start + index)
+
+    def __iter__(self):
+        return self.source.iter_lines(self.start, self.start + self.count)
+
+    def nbytes(self, end=None):
+        end = self.count if end is None else end
+        return self.source.span_bytes(self.start, self.start + end)
+
+    def line_at_byte(self, byte_offset):
+        """Line inside this span containing byte_offset (relative to the span start)."""
+        offsets = self.source.offsets
+        target = offsets[self.start] + byte_offset
+        return bisect_right(offsets, target, self.start, self.start + self.count) - 1 - self.start
+
+
+class _RopeNode:
+    __slots__ = ("chunk", "priority", "left", "right", "size", "nbytes", "chunk_nbytes")
+
+    def __init__(self, chunk, priority=None):
+        self.chunk = chunk # list of str, or a _FileSpan
+        self.priority = random.random() if priority is None else priority
+        self.left = None
+        self.right = None
+        self.size = 0   # Lines in this subtree
+        self.nbytes = 0 # Saved size of this subtree in bytes
+        # Saved size of the chunk alone, measured once and adjusted by every edit to the chunk
+        if isinstance(chunk, _FileSpan):
+            self.chunk_nbytes = chunk.nbytes()
+        else:
+            self.chunk_nbytes = sum(map(_line_bytes, chunk))
+        self.update()
+
+    def update(self):
+        """Recomputes the subtree totals from the children's, nothing is measured again."""
+        size = len(self.chunk)
+        nbytes = self.chunk_nbytes
+        if self.left:
+            size += self.left.size
+            nbytes += self.left.nbytes
+        if self.right:
+            size += self.right.size
+            nbytes += self.right.nbytes
+        self.size = size
+        self.nbytes = nbytes
+
+
+def _merge(left, right):
+    """Merges two treaps where every line of 'left' comes before 'right'."""
+    if left is None: return right
+    if right is None: return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    right.left = _merge(left, right.left)
+    right.update()
+    return right
+
+
+def _split(node, num_lines):
+    """
+    Splits a treap into (first num_lines lines, the rest).
+    num_lines must fall on a chunk boundary.
+    """
+    if node is None:
+        return None, None
+    left_size = node.left.size if node.left else 0
+    if num_lines <= left_size:
+        l, r = _split(node.left, num_lines)
+        node.left = r
+        node.update()
+        return l, node
+    l, r = _split(node.right, num_lines - left_size - len(node.chunk))
+    node.right = l
+    node.update()
+    return node, r
+
+
+def _build(chunks):
+    """Builds a treap over chunks in O(n) (Cartesian tree construction)."""
+    stack = []
+    for chunk in chunks:
+        node = _RopeNode(chunk)
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+    if not stack:
+        return None
+
+    # Sizes were computed before children were attached, fix them bottom-up.
+    root = stack[0]
+    order = []
+    pending = [root]
+    while pending:
+        n = pending.pop()
+        order.append(n)
+        if n.left: pending.append(n.left)
+        if n.right: pending.append(n.right)
+    for n in reversed(order):
+        n.update()
+    return root
+
+
+class LineRope:
+    """
+    Balanced rope of lines, a drop-in replacement for the list of strings in Buffer.
+
+    Lines live in small chunks held by a treap ordered by position, each node
+    also tracking its subtree's line count and saved byte size. Indexing, insert,
+    pop and assignment cost O(log n) regardless of how long the document is.
+
+    A chunk can also be a span of a memory-mapped file (see from_mapped_file);
+    spans are only decoded line by line on access, and are turned into regular
+    chunks around a line the first time it is edited.
+    """
+
+    def __init__(self, lines=None):
+        lines = list(lines) if lines else []
+        self.root = _build([lines[i:i + CHUNK_LINES] for i in range(0, len(lines), CHUNK_LINES)])
+
+    @classmethod
+    def from_mapped_file(cls, mapped_file):
+        """Creates a rope viewing every indexed line of a MappedFile without decoding any."""
+        rope = cls()
+        if mapped_file.line_count:
+            rope.root = _RopeNode(_FileSpan(mapped_file, 0, mapped_file.line_count))
+        return rope
+
+    def extend_from_mapped_file(self, mapped_file, start, count):
+        """Appends lines [start, start + count) of a MappedFile, e.g. as background indexing finds them."""
+        if count <= 0:
+            return
+        path = []
+        node = self.root
+        while node:
+            path.append(node)
+            node = node.right
+
+        last = path[-1].chunk if path else None
+        if isinstance(last, _FileSpan) and last.source is mapped_file and last.start + last.count == start:
+            # Grow the trailing span in place, only the right spine's totals change
+            added_bytes = mapped_file.span_bytes(start, start + count)
+            last.count += count
+            path[-1].chunk_nbytes += added_bytes
+            for p in path:
+                p.size += count
+                p.nbytes += added_bytes
+        else:
+            self.root = _merge(self.root, _RopeNode(_FileSpan(mapped_file, start, count)))
+
+    def __len__(self):
+        return self.root.size if self.root else 0
+
+    def __bool__(self):
+        return self.root is not None and self.root.size > 0
+
+    def _iter_chunks(self):
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.chunk
+            node = node.right
+
+    def __iter__(self):
+        for chunk in self._iter_chunks():
+            yield from chunk
+
+    def snapshot(self):
+        """
+        The document as a list of pieces for saving: a copied list of line strings per
+        edited chunk, or a (MappedFile, start, count) tuple per unedited file span.
+        """
+        pieces = []
+        for chunk in self._iter_chunks():
+            if isinstance(chunk, _FileSpan):
+                pieces.append((chunk.source, chunk.start, chunk.count))
+            else:
+                pieces.append(list(chunk))
+        return pieces
+
+    def __repr__(self):
+        return f"LineRope({len(self)} lines)"
+
+    def _normalize_index(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("LineRope index out of range")
+        return index
+
+    def _find(self, index):
+        """Returns (path from root, offset of index inside the last node's chunk)."""
+        path = []
+        node = self.root
+        while node:
+            path.append(node)
+            left_size = node.left.size if node.left else 0
+            if index < left_size:
+                node = node.left
+                continue
+            index -= left_size
+            if index < len(node.chunk):
+                return path, index
+            index -= len(node.chunk)
+            node = node.right
+        raise IndexError("LineRope index out of range")
+
+    def _find_editable(self, index):
+        """Like _find, but first turns a file span around index into a regular chunk."""
+        path, offset = self._find(index)
+        span = path[-1].chunk
+        if not isinstance(span, _FileSpan):
+            return path, offset
+
+        chunk_start = self._chunk_start(path)
+        window_start = max(0, offset - CHUNK_LINES // 2)
+        window_end = min(span.count, window_start + CHUNK_LINES)
+
+        pieces = []
+        if window_start > 0:
+            pieces.append(_RopeNode(_FileSpan(span.source, span.start, window_start)))
+        pieces.append(_RopeNode(span[window_start:window_end]))
+        if window_end < span.count:
+            pieces.append(_RopeNode(_FileSpan(span.source, span.start + window_end, span.count - window_end)))
+
+        left, rest = _split(self.root, chunk_start)
+        _, right = _split(rest, span.count)
+        middle = None
+        for piece in pieces:
+            middle = _merge(middle, piece)
+        self.root = _merge(_merge(left, middle), right)
+        return self._find(index)
+
+    def _chunk_start(self, path):
+        """Line index of the first line of the last node in path."""
+        start = 0
+        for parent, child in zip(path, path[1:]):
+            if child is parent.right:
+                start += (parent.left.size if parent.left else 0) + len(parent.chunk)
+        last = path[-1]
+        return start + (last.left.size if last.left else 0)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        path, offset = self._find(self._normalize_index(index))
+        return path[-1].chunk[offset]
+
+    def __setitem__(self, index, line):
+        path, offset = self._find_editable(self._normalize_index(index))
+        chunk = path[-1].chunk
+        delta = _line_bytes(line) - _line_bytes(chunk[offset])
+        chunk[offset] = line
+        path[-1].chunk_nbytes += delta
+        for node in path:
+            node.nbytes += delta
+
+    def insert(self, index, line):
+        n = len(self)
+        if index < 0:
+            index = max(0, index + n)
+        index = min(index, n)
+
+        if self.root is None:
+            self.root = _RopeNode([line])
+            return
+
+        if index == n: # Append goes at the end of the last chunk
+            path, offset = self._find_editable(n - 1)
+            offset += 1
+        else:
+            path, offset = self._find_editable(index)
+
+        node = path[-1]
+        node.chunk.insert(offset, line)
+        line_bytes = _line_bytes(line)
+        node.chunk_nbytes += line_bytes
+        for p in path:
+            p.size += 1
+            p.nbytes += line_bytes
+
+        if len(node.chunk) > MAX_CHUNK_LINES:
+            self._split_chunk(path)
+
+    def append(self, line):
+        self.insert(len(self), line)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def pop(self, index=-1):
+        path, offset = self._find_editable(self._normalize_index(index))
+        node = path[-1]
+        line = node.chunk.pop(offset)
+        line_bytes = _line_bytes(line)
+        node.chunk_nbytes -= line_bytes
+        for p in path:
+            p.size -= 1
+            p.nbytes -= line_bytes
+
+        if not node.chunk:
+            self._remove_node(path)
+        return line
+
+    def _split_chunk(self, path):
+        """Moves the back half of an oversized chunk into a new node right after it."""
+        node = path[-1]
+        chunk_start = self._chunk_start(path)
+        half = len(node.chunk) // 2
+        tail = node.chunk[half:]
+        del node.chunk[half:]
+        tail_bytes = sum(map(_line_bytes, tail))
+        node.chunk_nbytes -= tail_bytes
+        for p in path:
+            p.size -= len(tail)
+            p.nbytes -= tail_bytes
+
+        boundary = chunk_start + len(node.chunk)
+        left, right = _split(self.root, boundary)
+        self.root = _merge(_merge(left, _RopeNode(tail)), right)
+
+    def _remove_node(self, path):
+        """Unlinks an emptied chunk node, its children take its place."""
+        node = path[-1]
+        replacement = _merge(node.left, node.right)
+        if len(path) == 1:
+            self.root = replacement
+        elif path[-2].left is node:
+            path[-2].left = replacement
+        else:
+            path[-2].right = replacement
+
+    def line_start_offset(self, index):
+        """Byte offset at which a line starts when the document is saved."""
+        if index != len(self):
+            index = self._normalize_index(index)
+        offset = 0
+        node = self.root
+        while node:
+            left_size = node.left.size if node.left else 0
+            if index < left_size:
+                node = node.left
+                continue
+            if node.left:
+                offset += node.left.nbytes
+            index -= left_size
+            if index <= len(node.chunk):
+                if isinstance(node.chunk, _FileSpan):
+                    return offset + node.chunk.nbytes(index)
+                return offset + sum(map(_line_bytes, node.chunk[:index]))
+            offset += node.chunk_nbytes
+            index -= len(node.chunk)
+            node = node.right
+        return offset
+
+    def line_at_offset(self, byte_offset):
+        """Index of the line containing a byte offset of the saved document."""
+        if byte_offset < 0:
+            return 0
+        line = 0
+        node = self.root
+        while node:
+            if node.left and byte_offset < node.left.nbytes:
+                node = node.left
+                continue
+            if node.left:
+                byte_offset -= node.left.nbytes
+                line += node.left.size
+            chunk_bytes = node.chunk_nbytes
+            if byte_offset < chunk_bytes:
+                if isinstance(node.chunk, _FileSpan):
+                    return line + node.chunk.line_at_byte(byte_offset)
+                for text in node.chunk:
+                    byte_offset -= _line_bytes(text)
+                    if byte_offset < 0:
+                        return line
+                    line += 1
+            byte_offset -= chunk_bytes
+            line += len(node.chunk)
+            node = node.right
+        return max(0, line - 1)
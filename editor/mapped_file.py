@@ -0,0 +1,149 @@
+import mmap
+import os
+import threading
+import time
+from array import array
+from itertools import accumulate
+
+# Bytes scanned for newlines per indexing step
+INDEX_CHUNK_BYTES = 8 * 1024 * 1024
+# Smaller steps on the indexing thread, each one holds the GIL while it runs
+BACKGROUND_INDEX_CHUNK_BYTES = 1024 * 1024
+
+
+class MappedFile:
+    """
+    Read-only memory map of a text file plus a compact line-start index.
+
+    offsets[i] is the byte offset where line i starts and offsets[i + 1] where
+    the next one starts (line terminator included), so the index costs 8 bytes
+    per line and a line is only decoded when get_line() asks for it.
+    """
+
+    def __init__(self, filepath, encoding='utf-8'):
+        self.filepath = filepath
+        self.encoding = encoding
+        self._file = open(filepath, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+        self.offsets = array('q', [0])
+        self.indexed_bytes = 0
+        self.index_complete = False
+        self.ends_with_newline = False
+
+        self._index_thread = None
+        self._stop_indexing = False
+        # Held while new offsets are published, so readers see a consistent line_count/end state
+        self.index_lock = threading.Lock()
+
+    def build_index(self):
+        """Indexes the whole file in one pass."""
+        while not self.index_next_chunk():
+            pass
+
+    def adopt_index(self, offsets):
+        """Uses line offsets computed elsewhere (e.g. while writing this file) instead of scanning."""
+        if not self.size or offsets[-1] != self.size or self.mm[-1:] != b'\n':
+            self.build_index() # Doesn't match the file, index it the slow way
+            return
+        with self.index_lock:
+            self.offsets = offsets
+            self.indexed_bytes = self.size
+            self.ends_with_newline = True
+            self.index_complete = True
+
+    @property
+    def newline(self):
+        """Line terminator used by the file, judged by its first line."""
+        if self.line_count and self.offsets[1] >= 2 and self.mm[self.offsets[1] - 2:self.offsets[1]] == b'\r\n':
+            return "\r\n"
+        return "\n"
+
+    def start_background_indexing(self):
+        """Indexes the rest of the file on a daemon thread. line_count grows as it runs."""
+        if self.index_complete or self._index_thread:
+            return
+        self._stop_indexing = False
+        self._index_thread = threading.Thread(target=self._index_in_background,
+                                              name="line-index", daemon=True)
+        self._index_thread.start()
+
+    def _index_in_background(self):
+        while not self._stop_indexing and not self.index_next_chunk(BACKGROUND_INDEX_CHUNK_BYTES):
+            time.sleep(0) # Let the UI thread run between chunks
+
+    def wait_for_index(self):
+        """Blocks until the whole file is indexed."""
+        if self._index_thread:
+            self._index_thread.join()
+            self._index_thread = None
+        self.build_index()
+
+    @property
+    def index_progress(self):
+        """Fraction of the file indexed so far, 0.0 to 1.0."""
+        if self.index_complete or not self.size:
+            return 1.0
+        return self.indexed_bytes / self.size
+
+    def index_next_chunk(self, max_bytes=INDEX_CHUNK_BYTES):
+        """Indexes up to max_bytes more of the file. Returns True once the index is complete."""
+        if self.index_complete:
+            return True
+
+        pos = self.indexed_bytes
+        end = min(self.size, pos + max_bytes)
+        chunk = self.mm[pos:end]
+        if end < self.size:
+            # Stop at the last newline so no line is split across chunks
+            last_newline = chunk.rfind(b'\n')
+            if last_newline != -1:
+                chunk = chunk[:last_newline + 1]
+                end = pos + last_newline + 1
+
+        # Every '\n' starts a new line one byte later
+        line_lengths = map((1).__add__, map(len, chunk.split(b'\n')[:-1]))
+        starts = accumulate(line_lengths, initial=pos)
+        next(starts)
+
+        with self.index_lock:
+            self.offsets.extend(starts)
+            self.indexed_bytes = end
+            if end >= self.size:
+                self.ends_with_newline = self.size > 0 and self.offsets[-1] == self.size
+                if not self.ends_with_newline:
+                    self.offsets.append(self.size) # Sentinel end for the unterminated last line
+                self.index_complete = True
+        return self.index_complete
+
+    @property
+    def line_count(self):
+        """Number of fully indexed lines."""
+        return len(self.offsets) - 1
+
+    def get_line(self, line_num):
+        raw = self.mm[self.offsets[line_num]:self.offsets[line_num + 1]]
+        return raw.decode(self.encoding, errors='replace').rstrip('\n\r')
+
+    def iter_lines(self, start, end):
+        for line_num in range(start, end):
+            yield self.get_line(line_num)
+
+    def span_bytes(self, start, end):
+        """Saved size of lines [start, end), counting a '\\n' for an unterminated last line."""
+        nbytes = self.offsets[end] - self.offsets[start]
+        if end == self.line_count and self.index_complete and not self.ends_with_newline and end > start:
+            nbytes += 1
+        return nbytes
+
+    def close(self):
+        if self._index_thread:
+            self._stop_indexing = True
+            self._index_thread.join()
+            self._index_thread = None
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close() # Reads after this raise ValueError rather than return nothing
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -90,6 +90,11 @@ class EditorState:
         
         self.mode = new_mode
 
+    def show_message(self, text):
+        """Shows a message on the command line (e.g. a finished save) without entering COMMAND mode."""
+        self.command_buffer = text
+        self.command_cursor_pos = len(text)
+
     def clear_command(self):
         self.command_buffer = ""
         self.command_cursor_pos = 0
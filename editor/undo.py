@@ -0,0 +1,150 @@
+from collections import deque
+
+# Default cap on the memory held by undo/redo history
+DEFAULT_UNDO_MAX_BYTES = 8 * 1024 * 1024
+
+# Edit kinds and their inverses. (line, col) is where the edit happens, payload:
+EDIT_INSERT = "insert"             # text inserted at (line, col), no newlines
+EDIT_DELETE = "delete"             # text removed from (line, col), no newlines
+EDIT_SPLIT = "split"               # line broken in two at col, payload unused
+EDIT_JOIN = "join"                 # line+1 appended to line, col is the old length of line
+EDIT_INSERT_LINES = "insert_lines" # tuple of whole lines inserted before line
+EDIT_DELETE_LINES = "delete_lines" # tuple of whole lines removed starting at line
+EDIT_SET_LINE = "set_line"         # (old_text, new_text) of line
+
+_INVERSE_KIND = {
+    EDIT_INSERT: EDIT_DELETE, EDIT_DELETE: EDIT_INSERT,
+    EDIT_SPLIT: EDIT_JOIN, EDIT_JOIN: EDIT_SPLIT,
+    EDIT_INSERT_LINES: EDIT_DELETE_LINES, EDIT_DELETE_LINES: EDIT_INSERT_LINES,
+    EDIT_SET_LINE: EDIT_SET_LINE,
+}
+
+# Rough per-edit bookkeeping cost on top of the text it holds
+_EDIT_OVERHEAD_BYTES = 96
+
+
+class Edit:
+    """One recorded change to a Buffer, small enough to keep thousands of them around."""
+    __slots__ = ("kind", "line", "col", "payload")
+
+    def __init__(self, kind, line, col=0, payload=None):
+        self.kind = kind
+        self.line = line
+        self.col = col
+        self.payload = payload
+
+    def inverse(self):
+        payload = self.payload
+        if self.kind == EDIT_SET_LINE:
+            payload = (payload[1], payload[0])
+        return Edit(_INVERSE_KIND[self.kind], self.line, self.col, payload)
+
+    def size(self):
+        if self.kind in (EDIT_INSERT, EDIT_DELETE):
+            return _EDIT_OVERHEAD_BYTES + len(self.payload)
+        if self.kind in (EDIT_INSERT_LINES, EDIT_DELETE_LINES, EDIT_SET_LINE):
+            return _EDIT_OVERHEAD_BYTES + sum(len(line) for line in self.payload)
+        return _EDIT_OVERHEAD_BYTES
+
+    def try_coalesce(self, other):
+        """Folds a following edit into this one when they extend the same run of typing. Returns True if merged."""
+        if other.line != self.line or other.kind != self.kind:
+            return False
+        if self.kind == EDIT_INSERT and other.col == self.col + len(self.payload):
+            self.payload += other.payload # Typing forward
+            return True
+        if self.kind == EDIT_DELETE:
+            if other.col + len(other.payload) == self.col: # Backspacing
+                self.payload = other.payload + self.payload
+                self.col = other.col
+                return True
+            if other.col == self.col: # Deleting forward
+                self.payload += other.payload
+                return True
+        return False
+
+
+class UndoJournal:
+    """
+    Undo/redo history of a Buffer. Edits are grouped into steps: every edit recorded
+    until close_step() belongs to the same step, and consecutive keystrokes within a
+    step are coalesced into one Edit. Once the history holds more than max_bytes,
+    the oldest steps are dropped.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_UNDO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._undo_steps = deque() # Each step is a list of Edits, oldest step first
+        self._redo_steps = []
+        self._open_step = None
+        self.suspended = 0 # While > 0 nothing is recorded (undo/redo replaying edits)
+
+    def record(self, edit):
+        if self.suspended:
+            return
+        if self._redo_steps: # A fresh edit makes the redo history unreachable
+            self.bytes_used -= sum(self._step_size(step) for step in self._redo_steps)
+            self._redo_steps.clear()
+
+        if self._open_step is None:
+            self._open_step = []
+            self._undo_steps.append(self._open_step)
+
+        if self._open_step:
+            last = self._open_step[-1]
+            old_size = last.size()
+            if last.try_coalesce(edit):
+                self.bytes_used += last.size() - old_size
+                self._evict()
+                return
+
+        self._open_step.append(edit)
+        self.bytes_used += edit.size()
+        self._evict()
+
+    def close_step(self):
+        """Ends the current undo step, the next edit starts a new one."""
+        self._open_step = None
+
+    def clear(self):
+        self._undo_steps.clear()
+        self._redo_steps.clear()
+        self._open_step = None
+        self.bytes_used = 0
+
+    @property
+    def can_undo(self):
+        return bool(self._undo_steps)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo_steps)
+
+    def pop_undo(self):
+        """Removes the newest step for undoing, returns its edits or None."""
+        self.close_step()
+        if not self._undo_steps:
+            return None
+        step = self._undo_steps.pop()
+        self._redo_steps.append(step)
+        return step
+
+    def pop_redo(self):
+        """Removes the newest undone step for redoing, returns its edits or None."""
+        self.close_step()
+        if not self._redo_steps:
+            return None
+        step = self._redo_steps.pop()
+        self._undo_steps.append(step)
+        return step
+
+    @staticmethod
+    def _step_size(step):
+        return sum(edit.size() for edit in step)
+
+    def _evict(self):
+        """Drops the oldest closed steps until the history fits in max_bytes."""
+        while self.bytes_used > self.max_bytes and self._undo_steps and \
+                self._undo_steps[0] is not self._open_step:
+            self.bytes_used -= self._step_size(self._undo_steps.popleft())
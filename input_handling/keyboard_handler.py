@@ -3,6 +3,7 @@ import os
 from editor.modes import EditorMode, EditorState, Operator
 from editor.buffer import Buffer
 from editor.cursor import Cursor
+from editor.io_executor import IOExecutor
 from rendering.renderer import EditorRenderer
 from syntax.highlighter import get_rules_for_extension
 
@@ -10,11 +11,15 @@ class KeyboardHandler:
     def __init__(self, editor_buffer: Buffer, 
                  editor_state: EditorState, 
                  cursor: Cursor, 
-                 editor_renderer: EditorRenderer):
+                 editor_renderer: EditorRenderer,
+                 io_executor: IOExecutor = None):
         self.buffer = editor_buffer
         self.state = editor_state
         self.cursor = cursor
         self.renderer = editor_renderer
+        self.io_executor = io_executor # File I/O runs inline when None
+        self._load_pending = False
+        self._save_pending = False # Its job reads from the mapped file until it's done
 
     def _reset_buffer_state_for_new_load(self):
         """Resets cursor and tells renderer to clear all line caches."""
@@ -30,6 +35,15 @@ class KeyboardHandler:
         """
         action_taken = False
 
+        # A message from an earlier command or finished save/load stays up until the next key
+        if self.state.mode != EditorMode.COMMAND and self.state.command_buffer:
+            self.state.clear_command()
+
+        # Each key outside INSERT mode starts a new undo step, so an insert session
+        # (including the key that entered it, e.g. 'o' or 'cc') is undone as one
+        if self.state.mode != EditorMode.INSERT:
+            self.buffer.journal.close_step()
+
         # --- Handle COMMAND mode input first if active ---
         if self.state.mode == EditorMode.COMMAND:
             action_taken = self._handle_command_mode(event)
@@ -118,22 +132,15 @@ class KeyboardHandler:
                     # --- Perform Deletion ---
                     if is_linewise_selection:
                         num_lines = end_l - start_l + 1
-                        self.renderer.handle_lines_deleted(start_l, num_lines)
-                        for _ in range(num_lines):
-                            if start_l < self.buffer.get_line_count():
-                                self.buffer.lines.pop(start_l)
-                        if not self.buffer.lines: self.buffer.lines.append("")
-                        self.buffer._mark_dirty()
+                        self.buffer.delete_lines(start_l, num_lines)
                         self.cursor.line = min(start_l, self.buffer.get_line_count() - 1)
                         self.cursor.col = 0
                     else: # Character-wise deletion
                         if start_l == end_l: # Single line character-wise delete
                             line_content = self.buffer.get_line(start_l)
                             if line_content is not None:
-                                self.renderer.invalidate_line_cache(start_l)
                                 # end_c is inclusive index of selection
-                                self.buffer.lines[start_l] = line_content[:start_c] + line_content[end_c + 1:]
-                                self.buffer._mark_dirty()
+                                self.buffer.set_line(start_l, line_content[:start_c] + line_content[end_c + 1:])
                                 self.cursor.line = start_l
                                 self.cursor.col = start_c
                         else: # Multi-line character-wise delete
@@ -147,21 +154,14 @@ class KeyboardHandler:
                             suffix_last_line = last_line_content[end_c + 1:]
                             
                             # 3. Combine prefix and suffix onto the first line
-                            self.buffer.lines[start_l] = prefix_first_line + suffix_last_line
-                            self.renderer.invalidate_line_cache(start_l) # First line changed
+                            self.buffer.set_line(start_l, prefix_first_line + suffix_last_line)
 
                             # 4. Determine lines to delete (middle lines + the original last line of selection)
                             # Lines from start_l + 1 up to and including end_l need to be removed
                             num_intermediate_lines_to_delete = end_l - (start_l + 1) + 1
                             
                             if num_intermediate_lines_to_delete > 0:
-                                self.renderer.handle_lines_deleted(start_l + 1, num_intermediate_lines_to_delete)
-                                for _ in range(num_intermediate_lines_to_delete):
-                                    if start_l + 1 < self.buffer.get_line_count(): # Check bounds
-                                        self.buffer.lines.pop(start_l + 1) # Keep popping at start_l + 1
-                            
-                            if not self.buffer.lines: self.buffer.lines.append("") # Ensure not empty
-                            self.buffer._mark_dirty()
+                                self.buffer.delete_lines(start_l + 1, num_intermediate_lines_to_delete)
                             
                             # Set cursor position
                             self.cursor.line = start_l
@@ -239,6 +239,11 @@ class KeyboardHandler:
             elif event.key == pg.K_f:
                 action_taken = self._scroll_viewport(page_size_ctrl)
                 return action_taken 
+            elif event.key == pg.K_r: # Ctrl+r - redo
+                return self._undo_redo(redo=True)
+
+        if event.key == pg.K_u and not mods & (pg.KMOD_CTRL | pg.KMOD_SHIFT): # 'u' - undo, not Ctrl+u or 'U'
+            return self._undo_redo(redo=False)
 
         if event.key == pg.K_SEMICOLON and (mods & pg.KMOD_SHIFT): # ':' key
             self.state.switch_to_mode(EditorMode.COMMAND)
@@ -283,11 +288,7 @@ class KeyboardHandler:
                 if not is_uppercase_P: # 'p' - put below current line
                     put_line_idx += 1
                 
-                self.renderer.handle_lines_inserted(insert_idx=put_line_idx, num_inserted_lines=len(lines_to_put))
-                for i, line_to_insert in enumerate(lines_to_put):
-                    self.buffer.lines.insert(put_line_idx + i, line_to_insert)
-                
-                self.buffer._mark_dirty()
+                self.buffer.insert_lines(put_line_idx, lines_to_put)
                 self.cursor.line = put_line_idx
                 self.cursor.col = 0
             else: # Character-wise put
@@ -309,8 +310,7 @@ class KeyboardHandler:
                     prefix = original_line_content[:put_target_col_idx]
                     suffix = original_line_content[put_target_col_idx:]
 
-                    self.buffer.lines[put_target_line_idx] = prefix + first_part
-                    self.renderer.invalidate_line_cache(put_target_line_idx)
+                    self.buffer.set_line(put_target_line_idx, prefix + first_part)
                     
                     lines_to_insert_for_renderer = []
                     current_insert_line_idx = put_target_line_idx + 1
@@ -322,9 +322,7 @@ class KeyboardHandler:
                             lines_to_insert_for_renderer.append(part)
                     
                     if lines_to_insert_for_renderer:
-                        self.renderer.handle_lines_inserted(current_insert_line_idx, len(lines_to_insert_for_renderer))
-                        for i, line_content in enumerate(lines_to_insert_for_renderer):
-                            self.buffer.lines.insert(current_insert_line_idx + i, line_content)
+                        self.buffer.insert_lines(current_insert_line_idx, lines_to_insert_for_renderer)
 
                     if is_uppercase_P:
                         self.cursor.line = put_target_line_idx
@@ -341,9 +339,8 @@ class KeyboardHandler:
                 else: # Single-line character-wise put (no newlines in yanked_text)
                     current_line = self.buffer.get_line(put_target_line_idx)
                     if current_line is not None: # Should always be true if line index is valid
-                        self.renderer.invalidate_line_cache(put_target_line_idx)
                         new_line_content = current_line[:put_target_col_idx] + yanked_text + current_line[put_target_col_idx:]
-                        self.buffer.lines[put_target_line_idx] = new_line_content
+                        self.buffer.set_line(put_target_line_idx, new_line_content)
                         
                         # Set cursor position
                         if is_uppercase_P: # 'P'
@@ -368,14 +365,12 @@ class KeyboardHandler:
             action_taken = True
         elif event.key == pg.K_o:
             if pg.key.get_mods() & pg.KMOD_SHIFT: # 'O' - Open line above
-                self.renderer.handle_lines_inserted(insert_idx=self.cursor.line, num_inserted_lines=1)
-                self.buffer.lines.insert(self.cursor.line, "")
+                self.buffer.insert_lines(self.cursor.line, [""])
                 self.cursor.col = 0
                 self.state.switch_to_mode(EditorMode.INSERT)
                 action_taken = True
             else: # 'o' - Open line below
-                self.renderer.handle_lines_inserted(insert_idx=self.cursor.line + 1, num_inserted_lines=1)
-                self.buffer.lines.insert(self.cursor.line + 1, "")
+                self.buffer.insert_lines(self.cursor.line + 1, [""])
                 self.cursor.line += 1
                 self.cursor.col = 0
                 self.state.switch_to_mode(EditorMode.INSERT)
@@ -383,7 +378,6 @@ class KeyboardHandler:
         elif event.key == pg.K_x:
             current_line_text = self.buffer.get_line(self.cursor.line)
             if current_line_text is not None and self.cursor.col < len(current_line_text):
-                self.renderer.invalidate_line_cache(self.cursor.line)
                 self.buffer.delete_char_at_cursor(self.cursor.line, self.cursor.col)
                 if self.cursor.col >= len(self.buffer.get_line(self.cursor.line) or "") and self.cursor.col > 0:
                     self.cursor.col -= 1
@@ -431,8 +425,6 @@ class KeyboardHandler:
         if page_size <=0: page_size = 1
 
         if event.key == pg.K_RETURN:
-            self.renderer.invalidate_line_cache(self.cursor.line)
-            self.renderer.handle_lines_inserted(insert_idx=self.cursor.line + 1, num_inserted_lines=1)
             self.buffer.split_line(self.cursor.line, self.cursor.col)
             self.cursor.line += 1
             self.cursor.col = 0
@@ -444,11 +436,6 @@ class KeyboardHandler:
             action_taken = self._scroll_viewport(page_size)
             return action_taken
         elif event.key == pg.K_DELETE:
-            # Invalidate cache for current line and potentially next if merging
-            self.renderer.invalidate_line_cache(self.cursor.line)
-            if self.cursor.line + 1 < self.buffer.get_line_count():
-                self.renderer.invalidate_line_cache(self.cursor.line + 1) # If merge happens
-
             if self.buffer.delete_char_at_cursor(self.cursor.line, self.cursor.col):
                 current_line_len = len(self.buffer.get_line(self.cursor.line) or "")
                 if self.cursor.col > current_line_len : # If cursor was past EOL of merged line
@@ -462,12 +449,9 @@ class KeyboardHandler:
 
             if self.buffer.delete_char(self.cursor.line, self.cursor.col):
                 if is_merge:
-                    self.renderer.invalidate_line_cache(prev_cursor_line - 1)
-                    self.renderer.handle_lines_deleted(delete_idx=prev_cursor_line, num_deleted_lines=1)
                     self.cursor.line -=1
                     self.cursor.col = len(self.buffer.get_line(self.cursor.line) or "")
                 else:
-                    self.renderer.invalidate_line_cache(self.cursor.line)
                     self.cursor.col -=1
                 action_taken = True
             action_taken = True
@@ -491,7 +475,6 @@ class KeyboardHandler:
             action_taken = True
         elif event.unicode:
             if event.unicode.isprintable() or event.unicode == '\t':
-                self.renderer.invalidate_line_cache(self.cursor.line)
                 if event.unicode == '\t':
                      for _ in range(4): # Simple tab to 4 spaces
                          self.buffer.insert_char(self.cursor.line, self.cursor.col, ' ')
@@ -502,6 +485,14 @@ class KeyboardHandler:
                 action_taken = True
         return action_taken
     
+    def _undo_redo(self, redo):
+        position = self.buffer.redo() if redo else self.buffer.undo()
+        if position is None:
+            self.state.show_message("Already at newest change" if redo else "Already at oldest change")
+            return True
+        self.cursor.set_pos(position[0], position[1], self.buffer)
+        return True
+
     def _scroll_viewport(self, num_lines_to_scroll):
         """Helper to scroll viewport and adjust cursor if it goes out of view.
            Positive num_lines_to_scroll moves view down (text up).
@@ -596,41 +587,29 @@ class KeyboardHandler:
         elif cmd == 'w':
             filepath = args[0] if args else self.buffer.filepath
             if filepath:
-                self.buffer.save_to_file(filepath)
-                self._update_syntax_highlighting_for_buffer()
-                self.state.switch_to_mode(self.state.previous_mode)
-            elif self.buffer.filepath: # No arg, but has a current path
-                self.buffer.save_to_file()
-                self._update_syntax_highlighting_for_buffer()
                 self.state.switch_to_mode(self.state.previous_mode)
+                self._save_buffer(filepath)
             else:
                 self.state.command_buffer = "Error: No filename given for :w"
                 self.state.switch_to_mode(EditorMode.COMMAND, preserve_command_state=True)
         elif cmd == 'wq':
-            # Save then quit
-            saved_successfully = False
+            # Save then quit, once the save has finished
             if self.buffer.filepath:
-                saved_successfully = self.buffer.save_to_file()
+                filepath = self.buffer.filepath
             elif args: # :wq filename
-                saved_successfully = self.buffer.save_to_file(args[0])
+                filepath = args[0]
             else: # :wq with no current name and no arg
                  self.state.command_buffer = "Error: No filename for :wq"
                  self.state.switch_to_mode(EditorMode.COMMAND, preserve_command_state=True)
                  return
-            
-            if saved_successfully or not self.buffer.dirty: # Quit if saved or wasn't dirty
-                pg.event.post(pg.event.Event(pg.QUIT))
-            else: # Save failed, show error
-                self.state.command_buffer = "Error: Save failed during :wq"
-                self.state.switch_to_mode(EditorMode.COMMAND, preserve_command_state=True)
+
+            self.state.switch_to_mode(self.state.previous_mode)
+            self._save_buffer(filepath, quit_after=True)
 
         elif cmd == 'e':
             if args:
-                filepath_to_open = args[0]
-                self._reset_buffer_state_for_new_load()
-                self.buffer.load_from_file(filepath_to_open)
-                self._update_syntax_highlighting_for_buffer()
-                self.state.switch_to_mode(self.state.previous_mode) # Return to normal after loading
+                self.state.switch_to_mode(self.state.previous_mode) # Return to normal, the load finishes later
+                self._load_buffer(args[0])
             else:
                 self.state.command_buffer = "Error: No filename given for :e"
                 self.state.switch_to_mode(EditorMode.COMMAND, preserve_command_state=True)
@@ -638,6 +617,73 @@ class KeyboardHandler:
             self.state.command_buffer = f"Error: Unknown command: {cmd}"
             self.state.switch_to_mode(EditorMode.COMMAND, preserve_command_state=True)
 
+    def _run_io(self, job, on_done):
+        """Runs a save/load job on the I/O executor (or inline without one), then on_done() on the main thread."""
+        if self.io_executor:
+            self.io_executor.submit(job.run, lambda _future: on_done())
+        else:
+            job.run()
+            on_done()
+
+    def _save_buffer(self, filepath, quit_after=False):
+        """Saves without blocking the event loop. With quit_after, quits once the save has succeeded."""
+        if self._load_pending:
+            # A snapshot now would still point into the file that the load is about to release
+            self.state.show_message("Error: Still loading a file, try again when it's open")
+            return
+        if self._save_pending:
+            # Finishing the first save remaps the buffer and closes the file a second job would copy from
+            self.state.show_message("Error: Still writing a file, try again when it's saved")
+            return
+        job = self.buffer.begin_save(filepath)
+        if job is None:
+            self.state.show_message("Error: No filepath specified for saving")
+            return
+        self.state.show_message(f"Writing '{job.target_path}'...")
+        self._save_pending = True
+
+        def on_done():
+            self._save_pending = False
+            if not self.buffer.complete_save(job):
+                during = " during :wq" if quit_after else ""
+                self.state.show_message(f"Error: Save failed{during}: {job.error}")
+                return
+            self._update_syntax_highlighting_for_buffer()
+            if quit_after:
+                if not self.buffer.dirty:
+                    pg.event.post(pg.event.Event(pg.QUIT))
+                    return
+                self.state.show_message("Error: Buffer changed while saving, not quitting")
+                return
+            self.state.show_message(f"'{job.target_path}' written, {job.bytes_written} bytes")
+
+        self._run_io(job, on_done)
+
+    def _load_buffer(self, filepath):
+        """Loads filepath without blocking the event loop, the buffer is swapped when it's read."""
+        if self._save_pending:
+            # The load would close the mapped file the save is still copying from
+            self.state.show_message("Error: Still writing a file, try again when it's saved")
+            return
+        job = self.buffer.begin_load(filepath)
+        self.state.show_message(f"Reading '{filepath}'...")
+        self._load_pending = True
+
+        def on_done():
+            self._load_pending = False
+            loaded = self.buffer.complete_load(job)
+            if job.error is not None: # Buffer left as it was
+                self.state.show_message(f"Error: Could not read '{filepath}': {job.error}")
+                return
+            self._reset_buffer_state_for_new_load()
+            self._update_syntax_highlighting_for_buffer()
+            if loaded:
+                self.state.show_message(f"'{filepath}' {self.buffer.get_line_count()} lines")
+            else:
+                self.state.show_message(f"'{filepath}' [New File]")
+
+        self._run_io(job, on_done)
+
     def _handle_operator_pending_mode(self, event):
         action_taken = True
         operator = self.state.active_operator
@@ -657,10 +703,7 @@ class KeyboardHandler:
                     self.state.set_register(line_content, type_is_linewise=True)
 
                 if self.buffer.get_line_count() > 0:
-                    self.renderer.handle_lines_deleted(delete_idx=start_op_line, num_deleted_lines=1)
-                    self.buffer.lines.pop(start_op_line)
-                    if not self.buffer.lines: self.buffer.lines.append("")
-                    self.buffer._mark_dirty()
+                    self.buffer.delete_lines(start_op_line, 1)
                     self.cursor.line = min(start_op_line, self.buffer.get_line_count() - 1)
                     self.cursor.col = 0
             elif operator == Operator.CHANGE: # 'cc' - delete line, then enter insert mode
@@ -669,11 +712,7 @@ class KeyboardHandler:
                     self.state.set_register(line_content, type_is_linewise=True)
 
                 if self.buffer.get_line_count() > 0:
-                    self.renderer.handle_lines_deleted(delete_idx=start_op_line, num_deleted_lines=1)
-                    self.buffer.lines.pop(start_op_line)
-                    self.renderer.handle_lines_inserted(insert_idx=start_op_line, num_inserted_lines=1)
-                    self.buffer.lines.insert(start_op_line, "")
-                    self.buffer._mark_dirty()
+                    self.buffer.set_line(start_op_line, "")
                     self.cursor.line = start_op_line
                     self.cursor.col = 0
                     self.state.switch_to_mode(EditorMode.INSERT)
@@ -737,18 +776,12 @@ class KeyboardHandler:
                     start_del_line = min(start_op_line, motion_end_line)
                     end_del_line = max(start_op_line, motion_end_line)
                     num_lines = end_del_line - start_del_line + 1
-                    self.renderer.handle_lines_deleted(start_del_line, num_lines)
-                    for _ in range(num_lines):
-                        if start_del_line < self.buffer.get_line_count():
-                             self.buffer.lines.pop(start_del_line)
-                    if not self.buffer.lines: self.buffer.lines.append("")
-                    self.buffer._mark_dirty()
+                    self.buffer.delete_lines(start_del_line, num_lines)
                     self.cursor.line = min(start_del_line, self.buffer.get_line_count() - 1)
                     self.cursor.col = 0
                 else: # Charwise delete (simplified), assuming single char for 'dl', 'dh' for now
                     del_line = start_op_line
                     del_col = motion_end_col
-                    self.renderer.invalidate_line_cache(del_line)
                     self.buffer.delete_char_at_cursor(del_line, del_col)
                     self.cursor.line = del_line
                     self.cursor.col = del_col
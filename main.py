@@ -1,15 +1,29 @@
+import sys
+import time
+_STARTUP_START = time.perf_counter() # Imports below are the first startup phase
+
 import pygame as pg
-from pygame.locals import *
-from OpenGL.GL import *
-from editor.buffer import Buffer
+from pygame.locals import DOUBLEBUF, OPENGL
+from OpenGL.GL import (glViewport, glClearColor, glMatrixMode, glLoadIdentity, glOrtho, glEnable, glDisable,
+                       glBlendFunc, GL_PROJECTION, GL_MODELVIEW, GL_BLEND, GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA,
+                       GL_DEPTH_TEST)
+from editor.buffer import Buffer, STORAGE_ROPE
 from rendering.renderer import EditorRenderer
 from editor.cursor import Cursor
 from editor.modes import EditorMode, EditorState
+from editor.io_executor import IOExecutor
 from input_handling.keyboard_handler import KeyboardHandler
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 800
 FPS = 60
+# Only redraw when something changed (key, blink, scroll, finished I/O), sleeping in between.
+# False redraws every frame at a fixed FPS.
+RENDER_ON_DEMAND = True
+# Wake-up interval while a save/load or background indexing is running
+BUSY_POLL_MS = 50
+# Print how long each startup phase took once the first frame is up
+PROFILE_STARTUP = "--profile-startup" in sys.argv[1:]
 
 def init_opengl():
     """Initialize basic OpenGL settings."""
@@ -26,32 +40,82 @@ def init_opengl():
 
 FONT_PATH = "assets/fonts/Consolas.ttf"
 FONT_SIZE = 24
+BUFFER_STORAGE = STORAGE_ROPE # STORAGE_LIST for the plain list of lines
+
+class StartupProfile:
+    """Wall clock time of each phase of startup, from the first import to the first frame."""
+
+    def __init__(self, start):
+        self.phases = [] # (phase name, seconds)
+        self._last = start
+
+    def mark(self, phase):
+        """Ends phase, which ran since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        print("Startup time by phase:")
+        for phase, seconds in self.phases:
+            print(f"  {phase:<28}{seconds * 1000:8.1f} ms")
+        print(f"  {'total':<28}{sum(seconds for _, seconds in self.phases) * 1000:8.1f} ms")
+
+def wait_for_events(timeout_ms):
+    """Blocks until an event arrives or timeout_ms passes, then returns every pending event."""
+    first_event = pg.event.wait(max(1, int(timeout_ms)))
+    events = [first_event] if first_event.type != pg.NOEVENT else []
+    return events + pg.event.get()
 
 def main():
+    startup = StartupProfile(_STARTUP_START)
+    startup.mark("imports")
     pg.init()
     screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), DOUBLEBUF | OPENGL)
     pg.display.set_caption("PyOpenGL Text Editor")
     clock = pg.time.Clock()
+    startup.mark("pygame init and window")
 
     init_opengl()
+    startup.mark("OpenGL setup")
 
     # Initialize editor components
-    editor_buffer = Buffer()
+    editor_buffer = Buffer(storage=BUFFER_STORAGE)
     editor_renderer = EditorRenderer(FONT_PATH, FONT_SIZE)
+    startup.mark("renderer and font")
     cursor = Cursor()
     editor_state = EditorState()
+    io_executor = IOExecutor()
 
-    keyboard_handler = KeyboardHandler(editor_buffer, editor_state, cursor, editor_renderer)
+    keyboard_handler = KeyboardHandler(editor_buffer, editor_state, cursor, editor_renderer, io_executor)
     keyboard_handler._update_syntax_highlighting_for_buffer()
+    startup.mark("editor state and input")
 
     editor_renderer._calculate_visible_lines(SCREEN_HEIGHT)
+    startup.mark("viewport and status font")
 
     running = True
+    needs_redraw = True
+    last_viewport_start_line = None
+    last_index_progress = None
     while running:
-        dt = clock.tick(FPS)
+        if RENDER_ON_DEMAND:
+            timeout_ms = cursor.blink_rate - cursor.blink_timer # Sleep until the next blink at most
+            if io_executor.busy or editor_buffer.indexing_progress() is not None:
+                timeout_ms = min(timeout_ms, BUSY_POLL_MS)
+            if needs_redraw or editor_renderer.line_states.pending: # First frame, or lexer states to scan
+                timeout_ms = 0
+            events = wait_for_events(timeout_ms)
+            dt = clock.tick()
+        else:
+            dt = clock.tick(FPS)
+            events = pg.event.get()
         action_taken = False
 
-        for event in pg.event.get():
+        for event in events:
+            if event.type != pg.MOUSEMOTION: # Keys, window exposure/resizes, quit...
+                needs_redraw = True
+
             if event.type == pg.QUIT:
                 running = False
             
@@ -62,7 +126,19 @@ def main():
                 if action_taken_by_handler & (editor_state.mode != EditorMode.COMMAND):
                     cursor.visible = True
                     cursor.blink_timer = 0
-                
+
+        # Finish saves/loads completed on the I/O thread (may post QUIT for :wq)
+        if io_executor.poll():
+            needs_redraw = True
+
+        # Pick up lines found by background indexing of a lazily loaded file
+        if editor_buffer.sync_index():
+            needs_redraw = True
+        index_progress = editor_buffer.indexing_progress()
+        if index_progress != last_index_progress:
+            last_index_progress = index_progress
+            needs_redraw = True
+
         if cursor.line < editor_state.viewport_start_line:
             editor_state.viewport_start_line = cursor.line
         elif cursor.line >= editor_state.viewport_start_line + editor_renderer.visible_lines_in_viewport:
@@ -89,18 +165,34 @@ def main():
         else:
                 editor_state.viewport_start_line = 0
 
+        # Scan toward lines drawn with provisional lexer states, a step per pass while idle
+        if editor_renderer.advance_line_states():
+            needs_redraw = True
+
+        if editor_state.viewport_start_line != last_viewport_start_line:
+            last_viewport_start_line = editor_state.viewport_start_line
+            needs_redraw = True
+
         cursor.blink_timer += dt
         if cursor.blink_timer >= cursor.blink_rate:
             cursor.blink_timer = 0
             cursor.visible = not cursor.visible
+            needs_redraw = True
+
+        if RENDER_ON_DEMAND and not needs_redraw:
+            continue
+        needs_redraw = False
 
-        glClear(GL_COLOR_BUFFER_BIT)
-        editor_renderer.render_buffer(editor_buffer, editor_state, SCREEN_HEIGHT, cursor)
-        editor_renderer.render_cursor(cursor, editor_buffer, editor_state, cursor.visible)
-        editor_renderer.render_status_bar(editor_state, editor_buffer, SCREEN_WIDTH, SCREEN_HEIGHT)
+        editor_renderer.render_frame(editor_buffer, editor_state, cursor, SCREEN_WIDTH, SCREEN_HEIGHT)
 
         pg.display.flip()
+        if startup is not None:
+            startup.mark("first frame")
+            if PROFILE_STARTUP:
+                startup.report()
+            startup = None
 
+    io_executor.shutdown() # Let a pending save finish before exiting
     editor_renderer.cleanup()
     pg.quit()
 
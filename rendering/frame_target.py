@@ -0,0 +1,76 @@
+from OpenGL.GL import *
+
+
+class FrameTarget:
+    """
+    An offscreen framebuffer (FBO with a color texture) that keeps its contents between
+    frames, unlike the window's back buffer after a flip. Drawing into it only the parts
+    that changed and blitting it to the window lets a frame skip everything else.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.fbo = None
+        self.texture_id = None
+
+    def create(self):
+        """Allocates the FBO. Returns False (and prints why) if the driver can't provide one."""
+        try:
+            self.texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.width, self.height, 0,
+                         GL_RGBA, GL_UNSIGNED_BYTE, None)
+            glBindTexture(GL_TEXTURE_2D, 0)
+
+            self.fbo = glGenFramebuffers(1)
+            glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+            glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture_id, 0)
+            status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            if status != GL_FRAMEBUFFER_COMPLETE:
+                raise RuntimeError(f"framebuffer incomplete (status {status})")
+        except Exception as e:
+            print(f"Offscreen framebuffer unavailable: {e}")
+            self.cleanup()
+            return False
+        return True
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+    def unbind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def blit_to_screen(self):
+        """Copies the whole target into the window's back buffer."""
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, 0)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height,
+                          GL_COLOR_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def copy_rows_from(self, source, src_top, dst_top, height):
+        """
+        Copies a full-width horizontal band of another target into this one. Offsets are
+        measured from the top, like the renderer's coordinates.
+        """
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, source.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.fbo)
+        src_y = self.height - (src_top + height)
+        dst_y = self.height - (dst_top + height)
+        glBlitFramebuffer(0, src_y, self.width, src_y + height, 0, dst_y, self.width, dst_y + height,
+                          GL_COLOR_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def cleanup(self):
+        if self.fbo is not None:
+            glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = None
+        if self.texture_id is not None:
+            glDeleteTextures(1, [self.texture_id])
+            self.texture_id = None
@@ -0,0 +1,117 @@
+import math
+import pygame as pg
+from OpenGL.GL import *
+
+# Side of the square atlas texture in pixels. At the default font size this holds
+# a couple of thousand glyphs; the atlas starts over if it ever fills up.
+ATLAS_SIZE = 1024
+
+
+class GlyphRun:
+    """
+    A line of text laid out as quads into a GlyphAtlas. Only the glyph positions are
+    kept, so a run stays valid until the atlas is reset (see TextRenderer.draw_glyph_run).
+    """
+    __slots__ = ("text", "starts", "colors", "width", "generation", "quads")
+
+    def __init__(self, text, starts, colors):
+        self.text = text         # Text the run was laid out from, colored in spans:
+        self.starts = starts     # offset into text where each span starts (e.g. packed token starts)
+        self.colors = colors     # (r, g, b) of each span
+        self.width = 0
+        self.generation = -1     # Atlas generation the quads index into
+        self.quads = []          # (x0, x1, s0, t0, s1, t1, (r, g, b, a) floats) relative to the line's left edge
+
+
+class GlyphAtlas:
+    """
+    One RGBA texture holding every glyph drawn so far, each rasterized once in white.
+    Glyphs are packed into shelves of line_height rows and tinted per quad when drawn,
+    so editing a line never uploads more than the few glyphs not seen before.
+    """
+
+    def __init__(self, font, ascender, line_height, size=ATLAS_SIZE):
+        self.font = font
+        self.ascender = ascender
+        self.line_height = line_height
+        self.size = size
+        self.texture_id = None
+        self.glyphs = {} # char -> (s0, t0, s1, t1, left_bearing, cell_width), None if nothing to draw
+        self.generation = 0
+        # Called just before a full atlas starts over and overwrites its texels, so quads
+        # still waiting to be drawn with the old glyphs (a QuadBatch) can be drawn first
+        self.on_reset = None
+        self._shelf_x = 0
+        self._shelf_y = 0
+
+    def _create_texture(self):
+        self.texture_id = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.size, self.size, 0,
+                     GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def reset(self):
+        """Forgets every packed glyph; runs laid out before this need a new layout."""
+        self.glyphs.clear()
+        self._shelf_x = 0
+        self._shelf_y = 0
+        self.generation += 1
+
+    def get_glyph(self, char, metric):
+        """
+        Returns the atlas entry for char, rasterizing and uploading it on first use.
+        metric is the font's (min_x, max_x, min_y, max_y, advance_x, advance_y) for char.
+        """
+        if char in self.glyphs:
+            return self.glyphs[char]
+        if not metric or char.isspace() or metric[1] <= metric[0]:
+            self.glyphs[char] = None # Advances the pen but draws nothing
+            return None
+
+        # Cells cover the glyph's ink, which may overhang its advance on either side
+        left_bearing = max(0, -int(math.floor(metric[0])))
+        cell_width = left_bearing + max(int(math.ceil(metric[1])), int(math.ceil(metric[4])), 1)
+        cell_height = self.line_height
+
+        if self.texture_id is None:
+            self._create_texture()
+        if self._shelf_x + cell_width > self.size:
+            self._shelf_x = 0
+            self._shelf_y += cell_height
+        if self._shelf_y + cell_height > self.size:
+            if self.on_reset is not None:
+                self.on_reset()
+            self.reset()
+        x, y = self._shelf_x, self._shelf_y
+
+        surface = pg.Surface((cell_width, cell_height), pg.SRCALPHA)
+        surface.fill((255, 255, 255, 0))
+        self.font.origin = True
+        try:
+            self.font.render_to(surface, (left_bearing, self.ascender), char, fgcolor=(255, 255, 255))
+        except Exception as e:
+            print(f"Error rasterizing glyph {char!r}: {e}")
+        self.font.origin = False
+
+        # Rows are flipped like every other text texture: t grows from the glyph's bottom edge
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, cell_width, cell_height,
+                        GL_RGBA, GL_UNSIGNED_BYTE, pg.image.tostring(surface, "RGBA", True))
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self._shelf_x += cell_width
+
+        entry = (x / self.size, y / self.size, (x + cell_width) / self.size,
+                 (y + cell_height) / self.size, left_bearing, cell_width)
+        self.glyphs[char] = entry
+        return entry
+
+    def cleanup(self):
+        if self.texture_id is not None:
+            glDeleteTextures(1, [self.texture_id])
+            self.texture_id = None
+        self.reset()
@@ -0,0 +1,85 @@
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from syntax.highlighter import tokenize_line, pack_tokens, TOKEN_TYPE_DEFAULT
+
+# Lines the prefetcher looks ahead, in viewport heights above and below the viewport
+PREFETCH_PAGES = 1
+# Rasterized lines waiting to be uploaded; the oldest are dropped beyond this
+PREFETCH_READY_MAX_LINES = 512
+
+
+class LinePrefetcher:
+    """
+    Gets lines just outside the viewport ready on a worker thread, so a page scrolling
+    into view doesn't tokenize and rasterize every line while the frame waits.
+
+    The worker tokenizes each line into the highlighter's token cache and, given a
+    text_renderer (texture per line mode), rasterizes it to RGBA bytes with a font face
+    of its own; take() then hands those to the main thread, which only uploads them.
+    The worker mostly runs while the main loop sits in pg.event.wait, which releases the GIL.
+    """
+
+    def __init__(self, text_renderer=None):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="editor-prefetch")
+        self._finished = queue.SimpleQueue()
+        self._generation = 0 # Bumped by every request, the worker drops lines of older ones
+        self._epoch = 0      # Bumped by clear(), results from before it are dropped
+        self.text_renderer = text_renderer
+        self._font = text_renderer.open_font() if text_renderer else None
+        self._ready = OrderedDict() # line cache key -> (RGBA bytes or None, width, height)
+
+    def request(self, lines, rules):
+        """
+        Prefetches lines, (line cache key, text, start state) tuples, nearest first.
+        Lines of earlier requests the worker hasn't got to yet are dropped.
+        """
+        self._generation += 1
+        if lines:
+            self._pool.submit(self._work, self._generation, self._epoch, lines, rules)
+
+    def __contains__(self, key):
+        return key in self._ready
+
+    def take(self, key):
+        """Returns and forgets the rasterized (RGBA bytes, width, height) of key, None if not ready."""
+        self.poll()
+        return self._ready.pop(key, None)
+
+    def poll(self):
+        """Collects lines the worker finished. Call from the main thread."""
+        while True:
+            try:
+                epoch, key, rasterized = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            if epoch != self._epoch:
+                continue # Rasterized before a font change
+            self._ready[key] = rasterized
+            self._ready.move_to_end(key)
+            if len(self._ready) > PREFETCH_READY_MAX_LINES:
+                self._ready.popitem(last=False)
+
+    def clear(self):
+        """Forgets everything prefetched, e.g. after a font change."""
+        self._generation += 1
+        self._epoch += 1
+        self._ready.clear()
+
+    def _work(self, generation, epoch, lines, rules):
+        try:
+            for key, text, state in lines:
+                if generation != self._generation:
+                    return # The viewport moved on
+                tokens = tokenize_line(text, rules, state)[0] if rules else pack_tokens([(TOKEN_TYPE_DEFAULT, text)])
+                if self.text_renderer is not None:
+                    rasterized = self.text_renderer.rasterize_line_packed(text, tokens, self._font)
+                    self._finished.put((epoch, key, rasterized))
+        except Exception as e:
+            print(f"Error prefetching lines: {e}")
+
+    def shutdown(self):
+        """Stops the worker, waiting for the line it's on (it may be using the font)."""
+        self._generation += 1
+        self._pool.shutdown(wait=True)
+        self._ready.clear()
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+# Default memory budget for rendered lines (texture bytes, or quad lists with the glyph atlas)
+DEFAULT_LINE_CACHE_BUDGET_BYTES = 64 * 1024 * 1024
+# Rough size of one laid out glyph quad (a tuple of floats) in a GlyphRun
+GLYPH_QUAD_BYTES = 120
+
+
+def rendered_line_bytes(entry):
+    """Memory held by a (texture_id or GlyphRun, width, height, text) line cache entry."""
+    rendered, width, height, _ = entry
+    if rendered is None:
+        return 0
+    if hasattr(rendered, "quads"): # GlyphRun, its glyphs live in the shared atlas
+        return len(rendered.quads) * GLYPH_QUAD_BYTES
+    return width * height * 4 # RGBA texture
+
+
+class LineTextureCache:
+    """
+    Rendered lines keyed by what they look like, (text, style) where style identifies the
+    highlighting, not by line number: identical lines (blank lines, '}', boilerplate) share
+    one entry, and inserting or deleting lines never renumbers anything.
+
+    Entries are reference counted by the viewport rows showing them (acquire/release).
+    Unreferenced entries stay cached, least recently used first, until the cache holds
+    more than max_bytes; referenced ones are never evicted.
+
+    free_entry(entry) frees whatever an entry owns, e.g. its GL texture.
+    """
+
+    def __init__(self, free_entry, max_bytes=DEFAULT_LINE_CACHE_BUDGET_BYTES):
+        self.free_entry = free_entry
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> [entry, nbytes, refcount], least recently released first
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def acquire(self, key):
+        """Returns the entry for key and takes a reference to it, or None if it must be rendered and put()."""
+        slot = self._entries.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        slot[2] += 1
+        return slot[0]
+
+    def put(self, key, entry):
+        """Caches a freshly rendered entry, already holding one reference for the caller."""
+        nbytes = rendered_line_bytes(entry)
+        self._entries[key] = [entry, nbytes, 1]
+        self.resident_bytes += nbytes
+        self._evict()
+
+    def release(self, key):
+        """Drops a reference taken by acquire() or put()."""
+        slot = self._entries.get(key)
+        if slot is None:
+            return
+        slot[2] -= 1
+        if slot[2] <= 0:
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        """Frees every entry. References held by callers become meaningless."""
+        for slot in self._entries.values():
+            self.free_entry(slot[0])
+        self._entries.clear()
+        self.resident_bytes = 0
+
+    def _evict(self):
+        while self.resident_bytes > self.max_bytes:
+            # Referenced entries are skipped; there are only about a screenful of them
+            key = next((key for key, slot in self._entries.items() if slot[2] <= 0), None)
+            if key is None:
+                break
+            slot = self._entries.pop(key)
+            self.resident_bytes -= slot[1]
+            self.free_entry(slot[0])
+            self.evictions += 1
+
+    def stats(self):
+        return {"entries": len(self._entries), "resident_bytes": self.resident_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
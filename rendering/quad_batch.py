@@ -0,0 +1,103 @@
+import ctypes
+from array import array
+from OpenGL.GL import *
+
+FLOATS_PER_VERTEX = 8 # x, y, s, t, r, g, b, a
+VERTEX_STRIDE = FLOATS_PER_VERTEX * 4
+
+
+class QuadBatch:
+    """
+    Collects every quad of a frame and draws them in flush(): one vertex upload into a
+    VBO and one glDrawArrays per run of quads sharing a texture, instead of a
+    glBegin/glEnd block (and a dozen PyOpenGL calls) per line, number and rect.
+
+    Quads are drawn in the order they were added; consecutive quads with the same
+    texture (or no texture) share a run, so callers draw layer by layer to keep runs long.
+    Vertices go straight into a float array, which is uploaded without a copy.
+    """
+
+    def __init__(self):
+        self._vertices = array('f')
+        self._runs = [] # [texture_id or None, first_vertex, vertex_count]
+        self._textures_to_delete = []
+        self.vbo = None
+
+    def add_quad(self, texture_id, x0, y0, x1, y1, s0=0.0, t0=0.0, s1=1.0, t1=1.0, color=(1.0, 1.0, 1.0, 1.0)):
+        """
+        Adds a quad with top-left (x0, y0) and bottom-right (x1, y1) on screen.
+        Texture rows are flipped like pg.image.tostring(..., True) data: t0 is the bottom edge.
+        color is an (r, g, b, a) tuple of floats, it tints textured quads.
+        """
+        r, g, b, a = color
+        self._vertices.extend((
+            x0, y1, s0, t0, r, g, b, a, # Bottom-left
+            x1, y1, s1, t0, r, g, b, a, # Bottom-right
+            x1, y0, s1, t1, r, g, b, a, # Top-right
+            x0, y0, s0, t1, r, g, b, a, # Top-left
+        ))
+        runs = self._runs
+        if runs and runs[-1][0] == texture_id:
+            runs[-1][2] += 4
+        else:
+            first = runs[-1][1] + runs[-1][2] if runs else 0
+            runs.append([texture_id, first, 4])
+
+    def add_rect(self, x0, y0, x1, y1, color_rgba):
+        """Adds an untextured rectangle, color as 0-255 (r, g, b, a)."""
+        self.add_quad(None, x0, y0, x1, y1, color=tuple(c / 255.0 for c in color_rgba))
+
+    def delete_texture_after_flush(self, texture_id):
+        """For per-frame textures that were added to the batch and can go once drawn."""
+        if texture_id is not None:
+            self._textures_to_delete.append(texture_id)
+
+    def flush(self):
+        """Draws everything added since the last flush and resets the batch."""
+        if self._runs:
+            self._draw_arrays()
+        glDisable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        if self._textures_to_delete:
+            glDeleteTextures(len(self._textures_to_delete), self._textures_to_delete)
+        self._vertices = array('f')
+        self._runs = []
+        self._textures_to_delete = []
+
+    def _draw_arrays(self):
+        vertices = self._vertices
+        data = (ctypes.c_float * len(vertices)).from_buffer(vertices) # A view, not a copy
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, ctypes.sizeof(data), data, GL_STREAM_DRAW)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(8))
+        glColorPointer(4, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(16))
+
+        for texture_id, first, count in self._runs:
+            self._bind(texture_id)
+            glDrawArrays(GL_QUADS, first, count)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    @staticmethod
+    def _bind(texture_id):
+        if texture_id is None:
+            glDisable(GL_TEXTURE_2D)
+        else:
+            glEnable(GL_TEXTURE_2D)
+            glBindTexture(GL_TEXTURE_2D, texture_id)
+
+    def cleanup(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
@@ -1,41 +1,93 @@
+from collections import OrderedDict
+from itertools import zip_longest
 from .text_renderer import TextRenderer
+from .quad_batch import QuadBatch
+from .frame_target import FrameTarget
+from .line_texture_cache import LineTextureCache, DEFAULT_LINE_CACHE_BUDGET_BYTES
+from .line_prefetcher import LinePrefetcher, PREFETCH_PAGES
 from OpenGL.GL import *
 from editor.modes import EditorMode, EditorState
-from syntax.highlighter import highlight_line, PYTHON_SYNTAX_RULES, TOKEN_TYPE_DEFAULT
+from syntax.highlighter import tokenize_line, LineStates, TOKEN_TYPE_DEFAULT
 from editor.buffer import Buffer
 from editor.cursor import Cursor
 
+# Placeholder for viewport rows with nothing valid drawn on them yet
+_ROW_NOT_DRAWN = object()
+
+# Line numbers kept rendered; least recently drawn ones are dropped beyond this
+LINE_NUMBER_CACHE_SIZE = 512
+
 class EditorRenderer:
-    def __init__(self, font_path, font_size):
+    def __init__(self, font_path, font_size, use_glyph_atlas=True, use_batching=True, use_partial_redraw=True,
+                 use_scroll_cache=True, line_cache_budget_bytes=DEFAULT_LINE_CACHE_BUDGET_BYTES, use_prefetch=True):
         self.text_renderer = TextRenderer(font_path, font_size)
+        # Rows queued earlier in the frame must be drawn before a full atlas overwrites their glyphs
+        self.text_renderer.atlas.on_reset = self.flush
+        # Draw buffer lines as quads into a shared glyph atlas instead of one texture per line
+        self.use_glyph_atlas = use_glyph_atlas
+        # Queue a frame's quads and draw them in flush() instead of one glBegin/glEnd per item
+        self.batch = QuadBatch() if use_batching else None
+        # Keep the frame in an offscreen target and only redraw the rows that changed
+        self.use_partial_redraw = use_partial_redraw
+        self.frame_target = None
+        # On a scroll, shift the rows still in view from frame_target into this spare target
+        # (they swap afterwards) and render only the rows that scrolled in
+        self.use_scroll_cache = use_scroll_cache
+        self.scroll_target = None
+        self._needs_full_redraw = True
+        self._damaged_rows = set()   # Viewport rows marked by damage_lines()
+        self._drawn_rows = []        # (line text, start state) shown on each viewport row in the frame target
+        self._drawn_cursor = None    # (line, col, visible) of the drawn cursor
+        self._drawn_viewport_start_line = None
+        self._drawn_layout = None    # Anything that moves every row when it changes (gutter, mode...)
         self.line_height = self.text_renderer.line_height
         self.visible_lines_in_viewport = 0
         self.padding_x = 5
         self.padding_y = 5
-        # Key: line_index, Value: (texture_id, actual_text_width, texture_height, text_content_str)
-        self.line_texture_cache = {}
+        # Key: (line text, style), Value: (texture_id, actual_text_width, texture_height, text_content_str)
+        # With the glyph atlas the first item is a GlyphRun instead of a texture id.
+        # LRU within a byte budget, line_texture_cache.stats() has hit/miss/eviction counters
+        self.line_texture_cache = LineTextureCache(self._cleanup_entry, line_cache_budget_bytes)
+        self._row_keys = [] # Line cache key shown on each viewport row, each holding a reference
+        # Lexer state each line starts in, for highlighting strings spanning several lines
+        self.line_states = LineStates()
+        # Tokenize (and without the atlas, rasterize) the lines around the viewport on a worker thread
+        self.prefetcher = LinePrefetcher(None if use_glyph_atlas else self.text_renderer) if use_prefetch else None
+        self._prefetched_for = None # (viewport start, buffer version, rules id) of the last prefetch request
         self.cursor_color = (240, 240, 240, 255)
         self.status_text_renderer_color = (180, 180, 180)
         self.line_num_renderer_color = (100, 100, 120)
         self.selection_bg_color_rgb = (50, 80, 120)
         self.cursor_width = 2
-        status_font_size = max(12, int(font_size * 0.8))
-        
-
-        try:
-            self.status_text_renderer = TextRenderer(font_path, status_font_size, self.status_text_renderer_color)
-        except Exception: # Fallback
-            self.status_text_renderer = self.text_renderer 
+        self.font_path = font_path
+        self.status_font_size = max(12, int(font_size * 0.8))
+        self._status_text_renderer = None # Loaded on first use, see status_text_renderer
 
-
-        # Line number renderer
-        try:
-            self.line_num_renderer = TextRenderer(font_path, font_size, self.line_num_renderer_color) 
-        except Exception:
-            self.line_num_renderer = self.text_renderer
+        # Line numbers are in the same font and size as the text, colors are passed per call,
+        # so they share its face, metrics and glyph atlas instead of loading the font again
+        self.line_num_renderer = self.text_renderer
 
         self.line_number_width = 0
-        self.gutter_padding = 5            
+        self.gutter_padding = 5
+        # Key: line number (1-indexed), Value: (texture_id or GlyphRun, width, height), least recently used first
+        self.line_number_cache = OrderedDict()
+        # Key: "status" or "command", Value: (text, color, (texture_id, width, height)) of the last rendered bar
+        self.ui_text_cache = {}            
+
+    @property
+    def status_text_renderer(self):
+        """Renderer of the status and command lines, in a smaller font loaded the first time it's needed."""
+        if self._status_text_renderer is None:
+            if self.status_font_size == self.text_renderer.font_size:
+                self._status_text_renderer = self.text_renderer
+            else:
+                try:
+                    self._status_text_renderer = TextRenderer(self.font_path, self.status_font_size,
+                                                              self.status_text_renderer_color)
+                    self._status_text_renderer.atlas.on_reset = self.flush
+                except Exception: # Fallback
+                    self._status_text_renderer = self.text_renderer
+        return self._status_text_renderer
 
     def get_selection_range(self, editor_state: EditorState, cursor_obj):
         """
@@ -64,8 +116,7 @@ class EditorRenderer:
         available_height = screen_height
         available_height -= (2 * self.padding_y)
 
-        if hasattr(self, 'status_text_renderer') and self.status_text_renderer:
-            available_height -= self.status_text_renderer.line_height
+        available_height -= self.status_text_renderer.line_height
         
         if self.line_height > 0:
             self.visible_lines_in_viewport = max(1, int(available_height / self.line_height))
@@ -82,7 +133,9 @@ class EditorRenderer:
         
         return self.line_num_renderer.get_string_width(str(max_line_num)) + self.gutter_padding
 
-    def render_buffer(self, buffer_obj: Buffer, editor_state: EditorState, screen_height_param, cursor_obj: Cursor):
+    def render_buffer(self, buffer_obj: Buffer, editor_state: EditorState, screen_height_param, cursor_obj: Cursor,
+                      first_row=0, end_row=None):
+        """Renders the visible lines, or only viewport rows [first_row, end_row) for a partial redraw."""
         if self.visible_lines_in_viewport == 0:
             self._calculate_visible_lines(screen_height_param)
 
@@ -90,65 +143,174 @@ class EditorRenderer:
         text_area_start_x = self.padding_x + self.line_number_width
 
         # Determine the range of lines to render based on viewport
-        start_render_line = editor_state.viewport_start_line
+        viewport_start_line = editor_state.viewport_start_line
+        start_render_line = viewport_start_line + first_row
         end_render_line = min(buffer_obj.get_line_count(), 
-                              start_render_line + self.visible_lines_in_viewport)
+                              viewport_start_line + self.visible_lines_in_viewport)
+        if end_row is not None:
+            end_render_line = min(end_render_line, viewport_start_line + end_row)
 
         current_selection_details = self.get_selection_range(editor_state, cursor_obj)
 
-        for i in range(start_render_line, end_render_line):
-            display_line_index = i - start_render_line
-            current_line_y_pos = self.padding_y + (display_line_index * self.line_height)
-
-            if editor_state.mode in [EditorMode.VISUAL, EditorMode.VISUAL_LINE]:
+        # Drawn layer by layer (selection, gutter, text) so batched quads share textures
+        if editor_state.mode in [EditorMode.VISUAL, EditorMode.VISUAL_LINE]:
+            for i in range(start_render_line, end_render_line):
+                current_line_y_pos = self.padding_y + ((i - viewport_start_line) * self.line_height)
                 self._render_selection_for_line(i, current_line_y_pos, text_area_start_x,
                                                 buffer_obj, current_selection_details, editor_state)
 
-            line_num_str = str(i + 1) # Line numbers are 1-indexed for display
-            ln_tex_id, ln_w, ln_h = self.line_num_renderer.render_text_to_texture(line_num_str, self.line_num_renderer_color)
-
-            if ln_tex_id:
-                ln_x_pos = self.padding_x + (self.line_number_width - self.gutter_padding - ln_w)
-                self.line_num_renderer.draw_text(ln_tex_id, ln_x_pos, current_line_y_pos, ln_w, ln_h)
-                self.line_num_renderer.cleanup_texture(ln_tex_id)
-
+        for i in range(start_render_line, end_render_line):
+            current_line_y_pos = self.padding_y + ((i - viewport_start_line) * self.line_height)
+            ln_tex_id, ln_w, ln_h = self._get_line_number(i + 1) # Line numbers are 1-indexed for display
+            ln_x_pos = self.padding_x + (self.line_number_width - self.gutter_padding - ln_w)
+            if self.use_glyph_atlas:
+                self.line_num_renderer.draw_glyph_run(ln_tex_id, ln_x_pos, current_line_y_pos, self.batch)
+            elif ln_tex_id:
+                self.line_num_renderer.draw_text(ln_tex_id, ln_x_pos, current_line_y_pos, ln_w, ln_h, self.batch)
+
+        rules = editor_state.current_syntax_rules
+        self._fit_row_keys()
+        for i in range(start_render_line, end_render_line):
+            current_line_y_pos = self.padding_y + ((i - viewport_start_line) * self.line_height)
             line_text = buffer_obj.get_line(i)
             if line_text is None: line_text = ""
 
-            cached_entry = self.line_texture_cache.get(i)
-            texture_id, tex_w, tex_h = None, 0, self.line_height
-            
-            # Only re-render texture if text content changes.
-            needs_texture_re_render = True
-            if cached_entry and cached_entry[3] == line_text:
-                 texture_id, tex_w, tex_h, _ = cached_entry
-                 needs_texture_re_render = False
-
-            if needs_texture_re_render:
-                if cached_entry: self.text_renderer.cleanup_texture(cached_entry[0])
-                
-                if editor_state.current_syntax_rules:
-                    # Syntax highlighting active: tokenize and render segmented
-                    syntax_tokens = highlight_line(line_text, editor_state.current_syntax_rules)
-                    texture_id, tex_w, tex_h_rendered = self.text_renderer.render_line_segmented_to_texture(
-                        syntax_tokens
-                    )
-                else:
-                    # No syntax highlighting: render plain
-                    texture_id, tex_w, tex_h_rendered = self.text_renderer.render_text_to_texture(
-                        line_text
-                    )
-                
-                self.line_texture_cache[i] = (texture_id, tex_w, tex_h_rendered, line_text)
-                tex_h = tex_h_rendered # tex_h will be self.line_height
+            # Same text looks different under other rules, or starting inside a multi-line string
+            state = self.line_states.start_state(i)
+            style_key = (id(rules), state) if rules else None
+            texture_id, tex_w, tex_h, _ = self._get_row_entry(i - viewport_start_line, (line_text, style_key),
+                                                              rules, state)
+
+            if self.use_glyph_atlas:
+                 self.text_renderer.draw_glyph_run(texture_id, text_area_start_x, current_line_y_pos, self.batch)
+            elif texture_id is not None:
+                 self.text_renderer.draw_text(texture_id, text_area_start_x, current_line_y_pos, tex_w, tex_h, self.batch)
+
+        # Redrawn rows past the end of the buffer show nothing anymore
+        last_row = self.visible_lines_in_viewport if end_row is None else end_row
+        for row in range(max(first_row, end_render_line - viewport_start_line), last_row):
+            self._set_row_key(row, None)
+
+    def _render_line(self, line_text, rules, state=None):
+        """Renders one buffer line, returns a line cache entry (texture_id or GlyphRun, width, height, text)."""
+        if self.use_glyph_atlas:
+            if rules:
+                glyph_run = self.text_renderer.layout_line_packed(line_text, tokenize_line(line_text, rules, state)[0])
+            else:
+                glyph_run = self.text_renderer.layout_text(line_text)
+            return glyph_run, glyph_run.width, self.line_height, line_text
 
-            if texture_id is not None:
-                 self.text_renderer.draw_text(texture_id, text_area_start_x, current_line_y_pos, tex_w, tex_h)
-        
-        # Pruning cache (as before)
-        max_buffer_line = buffer_obj.get_line_count() - 1
-        keys_to_prune = [k for k in self.line_texture_cache if k > max_buffer_line]
-        for k_prune in keys_to_prune: self._cleanup_cached_texture(k_prune)
+        if rules:
+            # Syntax highlighting active: tokenize and render segmented
+            texture_id, tex_w, tex_h = self.text_renderer.render_line_packed_to_texture(
+                line_text, tokenize_line(line_text, rules, state)[0])
+        else:
+            # No syntax highlighting: render plain
+            texture_id, tex_w, tex_h = self.text_renderer.render_text_to_texture(line_text)
+        return texture_id, tex_w, tex_h, line_text
+
+    def _get_row_entry(self, row, key, rules, state=None):
+        """Cache entry for a viewport row showing key = (text, style), rendering it only if no row ever had it."""
+        entry = self.line_texture_cache.acquire(key)
+        if entry is None:
+            entry = self._take_prefetched(key) or self._render_line(key[0], rules, state)
+            self.line_texture_cache.put(key, entry)
+        self._set_row_key(row, key, acquired=True)
+        return entry
+
+    def _take_prefetched(self, key):
+        """A line cache entry made from a line the prefetcher rasterized, None if it hasn't (or with the atlas)."""
+        if self.prefetcher is None or self.use_glyph_atlas:
+            return None
+        rasterized = self.prefetcher.take(key)
+        if rasterized is None:
+            return None
+        texture_data, width, height = rasterized
+        texture_id = self.text_renderer.upload_texture(texture_data, width, height) if texture_data else None
+        return texture_id, width, height, key[0]
+
+    def _prefetch_around(self, buffer_obj, editor_state):
+        """Asks the prefetcher for the lines a page above and below the viewport, once per viewport position and edit."""
+        rules = editor_state.current_syntax_rules
+        if self.prefetcher is None or (self.use_glyph_atlas and not rules):
+            return # Plain lines are laid out from the atlas without any per-line work worth doing ahead
+        viewport_start_line = editor_state.viewport_start_line
+        request = (viewport_start_line, buffer_obj.version, id(rules))
+        if request == self._prefetched_for:
+            return
+        self._prefetched_for = request
+
+        margin = self.visible_lines_in_viewport * PREFETCH_PAGES
+        below_start = viewport_start_line + self.visible_lines_in_viewport
+        below = range(below_start, min(below_start + margin, buffer_obj.get_line_count()))
+        above = range(viewport_start_line - 1, max(viewport_start_line - margin, 0) - 1, -1)
+        lines = []
+        for pair in zip_longest(below, above): # Nearest lines first
+            for line_num in pair:
+                if line_num is None:
+                    continue
+                line_text = buffer_obj.get_line(line_num) or ""
+                state = self.line_states.start_state(line_num)
+                key = (line_text, (id(rules), state) if rules else None)
+                if key not in self.line_texture_cache and key not in self.prefetcher:
+                    lines.append((key, line_text, state))
+        self.prefetcher.request(lines, rules)
+
+    def advance_line_states(self):
+        """
+        Scans a step toward lines drawn with provisional lexer states (see LineStates.advance).
+        Returns True once their states are known; the next frame redraws the rows they changed.
+        """
+        if not self.line_states.advance():
+            return False
+        self._prefetched_for = None # Lines around the viewport were prefetched with provisional states
+        return True
+
+    def _set_row_key(self, row, key, acquired=False):
+        """Records what a viewport row shows, dropping its reference to what it showed before."""
+        old_key = self._row_keys[row]
+        self._row_keys[row] = key
+        if old_key is not None:
+            self.line_texture_cache.release(old_key)
+        if key is not None and not acquired:
+            self.line_texture_cache.acquire(key)
+
+    def _fit_row_keys(self):
+        if len(self._row_keys) != self.visible_lines_in_viewport:
+            for row in range(len(self._row_keys)):
+                self._set_row_key(row, None)
+            self._row_keys = [None] * self.visible_lines_in_viewport
+
+    def _shift_row_keys(self, scrolled_rows):
+        """Moves row references along with a scroll, releasing the rows that left the viewport."""
+        keys = self._row_keys
+        for row, key in enumerate(keys):
+            if key is not None and not 0 <= row - scrolled_rows < len(keys):
+                self.line_texture_cache.release(key)
+        self._row_keys = [keys[row + scrolled_rows] if 0 <= row + scrolled_rows < len(keys) else None
+                          for row in range(len(keys))]
+
+    def _get_line_number(self, line_number):
+        """Returns the cached (texture_id or GlyphRun, width, height) of a gutter number, rendering it once."""
+        entry = self.line_number_cache.get(line_number)
+        if entry:
+            self.line_number_cache.move_to_end(line_number)
+            return entry
+
+        if self.use_glyph_atlas:
+            run = self.line_num_renderer.layout_text(str(line_number), self.line_num_renderer_color)
+            entry = (run, run.width, self.line_num_renderer.line_height)
+        else:
+            entry = self.line_num_renderer.render_text_to_texture(str(line_number), self.line_num_renderer_color)
+        self.line_number_cache[line_number] = entry
+
+        # Keep at least a few screens' worth so a full viewport never evicts itself
+        max_entries = max(LINE_NUMBER_CACHE_SIZE, 4 * self.visible_lines_in_viewport)
+        while len(self.line_number_cache) > max_entries:
+            _, evicted = self.line_number_cache.popitem(last=False)
+            if not self.use_glyph_atlas:
+                self._release_frame_texture(self.line_num_renderer, evicted[0])
+        return entry
 
     def _render_selection_for_line(self, buffer_line_idx, line_y_pos, text_area_start_x,
                                    buffer_obj: Buffer, selection_details, editor_state: EditorState):
@@ -182,8 +344,7 @@ class EditorRenderer:
                  x2 = text_area_start_x + self.text_renderer.get_string_width(" ")
         else:
             if buffer_line_idx == sel_start_line:
-                text_before_sel_start = current_line_text_for_calc[:sel_start_col]
-                x1 = text_area_start_x + self.text_renderer.get_string_width(text_before_sel_start)
+                x1 = text_area_start_x + self.text_renderer.get_column_x(current_line_text_for_calc, sel_start_col)
             else:
                 x1 = text_area_start_x
 
@@ -193,16 +354,13 @@ class EditorRenderer:
                 elif sel_end_col >= len(current_line_text_for_calc) - 1:
                      x2 = text_area_start_x + self.text_renderer.get_string_width(current_line_text_for_calc)
                 else:
-                     text_up_to_sel_end_inclusive = current_line_text_for_calc[:sel_end_col + 1]
-                     x2 = text_area_start_x + self.text_renderer.get_string_width(text_up_to_sel_end_inclusive)
+                     x2 = text_area_start_x + self.text_renderer.get_column_x(current_line_text_for_calc, sel_end_col + 1)
             else:
                  x2 = text_area_start_x + self.text_renderer.get_string_width(current_line_text_for_calc)
 
 
         if x1 < x2 : 
-            glDisable(GL_TEXTURE_2D) 
-            glColor3ub(*self.selection_bg_color_rgb)
-            glRectf(x1, line_y_pos, x2, line_y_pos + self.line_height)
+            self._draw_rect(x1, line_y_pos, x2, line_y_pos + self.line_height, (*self.selection_bg_color_rgb, 255))
     
 
     def render_cursor(self, cursor_obj: Cursor, buffer_obj: Buffer, editor_state: EditorState, is_visible=True):
@@ -229,20 +387,12 @@ class EditorRenderer:
         current_line_text = buffer_obj.get_line(line_num)
         if current_line_text is None: return
 
-        text_before_cursor = current_line_text[:col_num]
-        
-        cursor_x_offset = text_area_start_x + self.text_renderer.get_string_width(text_before_cursor)
+        cursor_x_offset = text_area_start_x + self.text_renderer.get_column_x(current_line_text, col_num)
         
         cursor_y_offset = self.padding_y + (cursor_display_line_index * self.line_height)
 
-        glColor4ub(self.cursor_color[0], self.cursor_color[1], self.cursor_color[2], self.cursor_color[3])
-        glDisable(GL_TEXTURE_2D)
-        glBegin(GL_QUADS)
-        glVertex2f(cursor_x_offset, cursor_y_offset)                                  # Top-left
-        glVertex2f(cursor_x_offset + self.cursor_width, cursor_y_offset)              # Top-right
-        glVertex2f(cursor_x_offset + self.cursor_width, cursor_y_offset + self.line_height) # Bottom-right
-        glVertex2f(cursor_x_offset, cursor_y_offset + self.line_height)               # Bottom-left
-        glEnd()
+        self._draw_rect(cursor_x_offset, cursor_y_offset,
+                        cursor_x_offset + self.cursor_width, cursor_y_offset + self.line_height, self.cursor_color)
 
     def render_command_line(self, editor_state: EditorState, screen_width, screen_height):
         if editor_state.mode != EditorMode.COMMAND and not editor_state.command_buffer:
@@ -253,7 +403,7 @@ class EditorRenderer:
         
         text_to_render = editor_state.command_buffer
         
-        texture_id, tex_w, tex_h = cmd_renderer.render_text_to_texture(text_to_render)
+        texture_id, tex_w, tex_h = self._get_ui_text("command", cmd_renderer, text_to_render)
 
         if texture_id:
             x_pos = self.padding_x
@@ -263,23 +413,16 @@ class EditorRenderer:
             # glColor4f(0.1, 0.1, 0.1, 1.0)
             # glRectf(0, y_pos - self.padding_y, screen_width, screen_height)
 
-            cmd_renderer.draw_text(texture_id, x_pos, y_pos, tex_w, tex_h)
-            cmd_renderer.cleanup_texture(texture_id)
+            cmd_renderer.draw_text(texture_id, x_pos, y_pos, tex_w, tex_h, self.batch)
 
             if editor_state.mode == EditorMode.COMMAND:
-                text_before_cmd_cursor = editor_state.command_buffer[:editor_state.command_cursor_pos]
-                cursor_x_cmd = x_pos + cmd_renderer.get_string_width(text_before_cmd_cursor)
+                cursor_x_cmd = x_pos + cmd_renderer.get_column_x(editor_state.command_buffer,
+                                                                 editor_state.command_cursor_pos)
                 
                 cmd_cursor_height = cmd_renderer.line_height 
 
-                glColor4ub(self.cursor_color[0], self.cursor_color[1], self.cursor_color[2], self.cursor_color[3])
-                glDisable(GL_TEXTURE_2D)
-                glBegin(GL_QUADS)
-                glVertex2f(cursor_x_cmd, y_pos)
-                glVertex2f(cursor_x_cmd + self.cursor_width, y_pos)
-                glVertex2f(cursor_x_cmd + self.cursor_width, y_pos + cmd_cursor_height)
-                glVertex2f(cursor_x_cmd, y_pos + cmd_cursor_height)
-                glEnd()
+                self._draw_rect(cursor_x_cmd, y_pos,
+                                cursor_x_cmd + self.cursor_width, y_pos + cmd_cursor_height, self.cursor_color)
 
     def render_status_bar(self, editor_state: EditorState, editor_buffer: Buffer, screen_width, screen_height):
         """Renders the status bar on the bottom left of the screen."""
@@ -287,9 +430,6 @@ class EditorRenderer:
             self.render_command_line(editor_state, screen_width, screen_height)
             return # Early return, so command bar takes precedence
 
-        if not hasattr(self, 'status_text_renderer'):
-            return
-        
         status_prefix = ""
         if editor_state.mode == EditorMode.OPERATOR_PENDING:
             status_prefix = f"({editor_state.active_operator.name[0].lower()}) "
@@ -300,66 +440,255 @@ class EditorRenderer:
         dirty_indicator = " [+]" if editor_buffer.dirty else ""
         # cursor_pos_str = f"Ln {cursor_obj.line+1}, Col {cursor_obj.col+1}"
 
-        status_text = f"{status_prefix}{mode_name}  {filepath_display}{dirty_indicator}"
+        index_progress = editor_buffer.indexing_progress()
+        indexing_display = f"  [indexing {index_progress:.0%}, {editor_buffer.get_line_count()} lines]" \
+            if index_progress is not None else ""
+
+        # Outside COMMAND mode the command buffer holds a message, e.g. from a finished save
+        message_display = f"  {editor_state.command_buffer}" if editor_state.command_buffer else ""
+
+        status_text = f"{status_prefix}{mode_name}  {filepath_display}{dirty_indicator}{indexing_display}{message_display}"
 
         texture_id, tex_w, tex_h = \
-            self.status_text_renderer.render_text_to_texture(status_text, self.status_text_renderer_color)
+            self._get_ui_text("status", self.status_text_renderer, status_text, self.status_text_renderer_color)
 
         if texture_id:
             x_pos = self.padding_x 
             y_pos = screen_height - tex_h - self.padding_y 
 
-            self.status_text_renderer.draw_text(texture_id, x_pos, y_pos, tex_w, tex_h)
-            self.status_text_renderer.cleanup_texture(texture_id)
+            self.status_text_renderer.draw_text(texture_id, x_pos, y_pos, tex_w, tex_h, self.batch)
 
-    def _cleanup_cached_texture(self, line_num):
-        """Helper to remove and cleanup a single cached texture by line number."""
-        entry = self.line_texture_cache.pop(line_num, None)
-        if entry:
-            self.text_renderer.cleanup_texture(entry[0])
+    def render_frame(self, buffer_obj: Buffer, editor_state: EditorState, cursor_obj: Cursor, screen_width, screen_height):
+        """
+        Draws a whole frame: buffer, cursor and status bar. With partial redraw on, the frame is
+        kept in an offscreen target and only the viewport rows that changed since the last frame
+        (edited lines, the cursor's old and new rows) plus the status bar are cleared and redrawn.
+        """
+        if self.visible_lines_in_viewport == 0:
+            self._calculate_visible_lines(screen_height)
+        self.line_states.sync(buffer_obj, editor_state.current_syntax_rules)
+
+        if self.use_partial_redraw and self.frame_target is None:
+            self.frame_target = FrameTarget(screen_width, screen_height)
+            if not self.frame_target.create():
+                self.use_partial_redraw = False # Redraw whole frames straight to the window
+                self.frame_target = None
+        if not self.use_partial_redraw:
+            glClear(GL_COLOR_BUFFER_BIT)
+            self._draw_full_frame(buffer_obj, editor_state, cursor_obj, screen_width, screen_height)
+            self._prefetch_around(buffer_obj, editor_state)
+            return
+        if self.use_scroll_cache and self.scroll_target is None:
+            self.scroll_target = FrameTarget(screen_width, screen_height)
+            if not self.scroll_target.create():
+                self.use_scroll_cache = False
+                self.scroll_target = None
+
+        damaged_rows, scrolled_rows = self._collect_damage(buffer_obj, editor_state, cursor_obj)
+        if scrolled_rows:
+            self._scroll_frame(scrolled_rows)
+        self.frame_target.bind()
+        if damaged_rows is None:
+            glClear(GL_COLOR_BUFFER_BIT)
+            self._draw_full_frame(buffer_obj, editor_state, cursor_obj, screen_width, screen_height)
+        else:
+            glEnable(GL_SCISSOR_TEST)
+            for first_row, end_row in self._row_runs(damaged_rows):
+                strip_top = self.padding_y + first_row * self.line_height
+                self._scissor(0, strip_top, screen_width, (end_row - first_row) * self.line_height, screen_height)
+                glClear(GL_COLOR_BUFFER_BIT)
+                self.render_buffer(buffer_obj, editor_state, screen_height, cursor_obj, first_row, end_row)
+                self.render_cursor(cursor_obj, buffer_obj, editor_state, cursor_obj.visible)
+                self.flush() # Scissor state applies when the batch is drawn
+
+            status_top = screen_height - self.status_text_renderer.line_height - self.padding_y
+            self._scissor(0, status_top, screen_width, screen_height - status_top, screen_height)
+            glClear(GL_COLOR_BUFFER_BIT)
+            self.render_status_bar(editor_state, buffer_obj, screen_width, screen_height)
+            self.flush()
+            glDisable(GL_SCISSOR_TEST)
+        self.frame_target.blit_to_screen()
+        self._prefetch_around(buffer_obj, editor_state)
+
+    def _draw_full_frame(self, buffer_obj, editor_state, cursor_obj, screen_width, screen_height):
+        self.render_buffer(buffer_obj, editor_state, screen_height, cursor_obj)
+        self.render_cursor(cursor_obj, buffer_obj, editor_state, cursor_obj.visible)
+        self.render_status_bar(editor_state, buffer_obj, screen_width, screen_height)
+        self.flush()
+
+    def _collect_damage(self, buffer_obj, editor_state, cursor_obj):
+        """
+        Returns (viewport rows to redraw or None when the whole frame must be redrawn,
+        rows the viewport scrolled by since the last frame that _scroll_frame can reuse).
+        """
+        viewport_start_line = editor_state.viewport_start_line
+        visible_lines = self.visible_lines_in_viewport
+        in_visual_mode = editor_state.mode in [EditorMode.VISUAL, EditorMode.VISUAL_LINE]
+        layout = (visible_lines, self._calculate_line_number_width(buffer_obj), editor_state.mode,
+                  # The selection follows the cursor, any move can reshape it
+                  (viewport_start_line, editor_state.visual_mode_anchor, cursor_obj.line, cursor_obj.col)
+                  if in_visual_mode else None)
+
+        line_count = buffer_obj.get_line_count()
+        rows = []
+        for row in range(visible_lines):
+            line_num = viewport_start_line + row
+            # A line whose text didn't change still needs redrawing when a string opened or closed above it
+            rows.append((buffer_obj.get_line(line_num), self.line_states.start_state(line_num))
+                        if line_num < line_count else None)
+        drawn_cursor = (cursor_obj.line, cursor_obj.col, cursor_obj.visible)
+
+        full_redraw = self._needs_full_redraw or layout != self._drawn_layout
+        scrolled_rows = 0
+        if not full_redraw and viewport_start_line != self._drawn_viewport_start_line:
+            scrolled_rows = viewport_start_line - self._drawn_viewport_start_line
+            if self.use_scroll_cache and abs(scrolled_rows) < visible_lines:
+                # Rows still in view move with the blit, the ones scrolling in count as undrawn
+                self._drawn_rows = [self._drawn_rows[row + scrolled_rows]
+                                    if 0 <= row + scrolled_rows < visible_lines else _ROW_NOT_DRAWN
+                                    for row in range(visible_lines)]
+                self._damaged_rows = {row - scrolled_rows for row in self._damaged_rows
+                                      if 0 <= row - scrolled_rows < visible_lines}
+                if len(self._row_keys) == visible_lines:
+                    self._shift_row_keys(scrolled_rows)
+            else:
+                full_redraw = True
+                scrolled_rows = 0
+
+        damaged = None
+        if not full_redraw:
+            damaged = self._damaged_rows
+            damaged.update(row for row, content in enumerate(rows) if content != self._drawn_rows[row])
+            if drawn_cursor != self._drawn_cursor:
+                for cursor_line in (self._drawn_cursor[0], cursor_obj.line):
+                    if 0 <= cursor_line - viewport_start_line < visible_lines:
+                        damaged.add(cursor_line - viewport_start_line)
+
+        self._needs_full_redraw = False
+        self._damaged_rows = set()
+        self._drawn_rows = rows
+        self._drawn_cursor = drawn_cursor
+        self._drawn_viewport_start_line = viewport_start_line
+        self._drawn_layout = layout
+        return damaged, scrolled_rows
+
+    def _scroll_frame(self, scrolled_rows):
+        """
+        Copies the rows that stay visible after scrolling by scrolled_rows into the spare
+        target at their new position, then makes it the current frame target.
+        """
+        kept_rows = self.visible_lines_in_viewport - abs(scrolled_rows)
+        src_row, dst_row = (scrolled_rows, 0) if scrolled_rows > 0 else (0, -scrolled_rows)
+        self.scroll_target.bind()
+        glClear(GL_COLOR_BUFFER_BIT)
+        self.scroll_target.copy_rows_from(self.frame_target,
+                                          self.padding_y + src_row * self.line_height,
+                                          self.padding_y + dst_row * self.line_height,
+                                          kept_rows * self.line_height)
+        self.frame_target, self.scroll_target = self.scroll_target, self.frame_target
+
+    @staticmethod
+    def _row_runs(rows):
+        """Groups row numbers into contiguous [first, end) runs."""
+        runs = []
+        for row in sorted(rows):
+            if runs and runs[-1][1] == row:
+                runs[-1][1] = row + 1
+            else:
+                runs.append([row, row + 1])
+        return runs
 
-    def cleanup(self):
-        """Cleanup all cached textures."""
-        for texture_id, _, _, _ in self.line_texture_cache.values():
-            self.text_renderer.cleanup_texture(texture_id)
-        self.line_texture_cache.clear()
+    @staticmethod
+    def _scissor(x, y, width, height, screen_height):
+        """glScissor with a top-left origin rect, like the rest of the renderer's coordinates."""
+        glScissor(int(x), int(screen_height - (y + height)), int(width), int(height))
 
-    def invalidate_line_cache(self, line_num):
-        """Invalidates a single line if its content changes (but line num stays)."""
-        self._cleanup_cached_texture(line_num)
-    
+    def damage_all(self):
+        """Forces the next frame to be redrawn completely."""
+        self._needs_full_redraw = True
 
-    def handle_lines_inserted(self, insert_idx, num_inserted_lines):
-        """Shift cache entries when lines are inserted."""
-        if num_inserted_lines <= 0:
+    def damage_lines(self, first_line, last_line):
+        """
+        Marks buffer lines [first_line, last_line] for redrawing even if their text didn't change,
+        e.g. when only their highlighting did. Text changes are detected automatically.
+        """
+        viewport_start_line = self._drawn_viewport_start_line
+        if viewport_start_line is None:
+            return # Nothing drawn yet, the first frame is a full one
+        for line_num in range(max(first_line, viewport_start_line),
+                              min(last_line, viewport_start_line + self.visible_lines_in_viewport - 1) + 1):
+            self._damaged_rows.add(line_num - viewport_start_line)
+
+    def _draw_rect(self, x1, y1, x2, y2, color_rgba):
+        """Solid rectangle (selection, cursors), batched when batching is on."""
+        if self.batch is not None:
+            self.batch.add_rect(x1, y1, x2, y2, color_rgba)
             return
+        glDisable(GL_TEXTURE_2D)
+        glColor4ub(*color_rgba)
+        glRectf(x1, y1, x2, y2)
 
-        keys_to_shift = sorted([k for k in self.line_texture_cache if k >= insert_idx], reverse=True)
-
-        for old_idx in keys_to_shift:
-            new_idx = old_idx + num_inserted_lines
-            self.line_texture_cache[new_idx] = self.line_texture_cache.pop(old_idx)
-        
-    def handle_lines_deleted(self, delete_idx, num_deleted_lines):
-        """Remove deleted lines from cache and shift subsequent entries."""
-        if num_deleted_lines <= 0:
-            return
+    def _get_ui_text(self, slot, text_renderer, text, color=None):
+        """
+        Returns (texture_id, width, height) for the status or command line, re-rendering
+        only when its text changed since the last frame (mode, file, dirty flag, command...).
+        """
+        cached = self.ui_text_cache.get(slot)
+        if cached and cached[0] == text and cached[1] == color:
+            return cached[2]
+        if cached:
+            self._release_frame_texture(text_renderer, cached[2][0])
+        rendered = text_renderer.render_text_to_texture(text, color)
+        self.ui_text_cache[slot] = (text, color, rendered)
+        return rendered
+
+    def _release_frame_texture(self, text_renderer, texture_id):
+        """Deletes a texture made for this frame only, once it has actually been drawn."""
+        if self.batch is not None:
+            self.batch.delete_texture_after_flush(texture_id)
+        else:
+            text_renderer.cleanup_texture(texture_id)
 
-        # Delete textures for the lines that are actually removed
-        for i in range(num_deleted_lines):
-            self._cleanup_cached_texture(delete_idx + i)
+    def flush(self):
+        """Draws the quads batched for this frame. Call once per frame, before swapping buffers."""
+        if self.batch is not None:
+            self.batch.flush()
 
-        # Shift cache entries for lines that were below the deleted block
-        keys_to_shift = sorted([k for k in self.line_texture_cache if k >= delete_idx + num_deleted_lines])
+    def _cleanup_entry(self, entry):
+        """Frees what a line cache entry owns. Glyph runs only reference the atlas, so there's nothing to free."""
+        if not self.use_glyph_atlas:
+            self.text_renderer.cleanup_texture(entry[0])
 
-        for old_idx in keys_to_shift:
-            new_idx = old_idx - num_deleted_lines
-            self.line_texture_cache[new_idx] = self.line_texture_cache.pop(old_idx)
         
+    def clear_ui_text_cache(self):
+        for _, _, rendered in self.ui_text_cache.values(): # Both bars use status_text_renderer
+            self.status_text_renderer.cleanup_texture(rendered[0])
+        self.ui_text_cache.clear()
+
+    def clear_line_number_cache(self):
+        for texture_id, _, _ in self.line_number_cache.values():
+            if not self.use_glyph_atlas:
+                self.line_num_renderer.cleanup_texture(texture_id)
+        self.line_number_cache.clear()
+
     def invalidate_all_cache(self):
-        keys_to_remove = list(self.line_texture_cache.keys())
-        for k in keys_to_remove:
-            self._cleanup_cached_texture(k)
+        self.damage_all()
+        self.line_texture_cache.clear()
+        self._row_keys = [None] * len(self._row_keys) # Their references went with the entries
+        if self.prefetcher is not None:
+            self.prefetcher.clear()
+            self._prefetched_for = None
 
     def cleanup(self):
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
         self.invalidate_all_cache()
+        self.clear_line_number_cache()
+        self.clear_ui_text_cache()
+        if self.batch is not None:
+            self.batch.cleanup()
+        for target in (self.frame_target, self.scroll_target):
+            if target is not None:
+                target.cleanup()
+        for renderer in {self.text_renderer, self._status_text_renderer, self.line_num_renderer} - {None}:
+            renderer.cleanup()
@@ -1,13 +1,19 @@
+from collections import OrderedDict
 import pygame as pg
 from OpenGL.GL import *
 from pygame import freetype
-from syntax.highlighter import SYNTAX_COLORS, TOKEN_TYPE_DEFAULT
+from syntax.highlighter import SYNTAX_COLORS, TOKEN_TYPE_DEFAULT, TOKEN_TYPES, pack_tokens, iter_tokens
+from rendering.glyph_atlas import GlyphAtlas, GlyphRun
 
-if not freetype.get_init():
-    freetype.init()
+# Printable ASCII, measured up front to detect a monospace font
+_ASCII_SAMPLE = "".join(chr(c) for c in range(32, 127))
+# Lines whose column-to-x prefix sums are kept (only needed for proportional fonts)
+COLUMN_OFFSETS_CACHE_SIZE = 256
 
 class TextRenderer:
     def __init__(self, font_path, font_size, color=(200, 200, 200)):
+        if not freetype.get_init():
+            freetype.init()
         try:
             self.font = freetype.Font(font_path, font_size)
         except Exception as e:
@@ -15,6 +21,7 @@ class TextRenderer:
             print("Falling back to default system font.")
             self.font = freetype.SysFont("monospace", font_size)
         
+        self.font_path = font_path
         self.font_size = font_size
         self.color = color
         self.ascender = self.font.get_sized_ascender()
@@ -25,6 +32,23 @@ class TextRenderer:
             self.line_height = font_size
 
         self.syntax_colors = SYNTAX_COLORS
+        # Color of each token type id in packed tokens
+        self.token_colors = tuple(self.syntax_colors.get(token_type, self.syntax_colors[TOKEN_TYPE_DEFAULT])
+                                  for token_type in TOKEN_TYPES)
+
+        self._advances = {} # char -> horizontal advance in (fractional) pixels
+        self._column_offsets = OrderedDict() # line text -> x of every column, least recently used first
+        sample_advances = {self.get_char_advance(char) for char in _ASCII_SAMPLE}
+        # Every ASCII char has the same advance: ASCII strings measure as len * advance
+        self.monospace_advance = sample_advances.pop() if len(sample_advances) == 1 else None
+        self.atlas = GlyphAtlas(self.font, self.ascender, self.line_height) # Texture created on first glyph
+
+    def open_font(self):
+        """A separate face of the same font, for rasterizing on another thread (faces aren't thread safe)."""
+        try:
+            return freetype.Font(self.font_path, self.font_size)
+        except Exception:
+            return freetype.SysFont("monospace", self.font_size)
 
     def get_highest_glyph_height(self) -> int:
         """Returns the height of the highest glyph"""
@@ -90,16 +114,33 @@ class TextRenderer:
         Renders a line composed of (token_type, text_segment) tuples to a single texture.
         Returns (texture_id, total_width, fixed_texture_height).
         """
-        if not tokenized_line_segments:
+        return self.render_line_packed_to_texture("".join(text for _, text in tokenized_line_segments),
+                                                  pack_tokens(tokenized_line_segments))
+
+    def render_line_packed_to_texture(self, line_text, packed_tokens):
+        """Like render_line_segmented_to_texture, for tokens packed like syntax.highlighter.tokenize_line's."""
+        texture_data, total_width, surface_height = self.rasterize_line_packed(line_text, packed_tokens)
+        if texture_data is None:
             return self.render_text_to_texture("") # Use old method for simple empty lines
+        return self.upload_texture(texture_data, total_width, surface_height), total_width, surface_height
+
+    def rasterize_line_packed(self, line_text, packed_tokens, font=None):
+        """
+        CPU half of render_line_packed_to_texture: returns (RGBA bytes, total_width,
+        fixed_texture_height), bytes None for an empty line. font is another face of this
+        renderer's font (see open_font) when called off the main thread.
+        """
+        font = font or self.font
+        segments = [(line_text[start:end], self.token_colors[type_id])
+                    for start, end, type_id in iter_tokens(line_text, packed_tokens) if start != end]
 
         # Calculate total width required for the line
         total_width = 0
-        for _, text_segment in tokenized_line_segments:
-            total_width += self.get_string_width(text_segment)
+        for text_segment, _ in segments:
+            total_width += self.get_string_width(text_segment, font)
         
         if total_width == 0:
-             return self.render_text_to_texture("") # Use old method for simple empty lines
+             return None, 0, self.line_height
         
         surface_width = max(1, total_width)
         surface_height = self.line_height
@@ -109,41 +150,39 @@ class TextRenderer:
         line_surface.fill((0, 0, 0, 0)) # Transparent background
 
         current_x_offset = 0
-        self.font.origin = True # For baseline alignment
+        font.origin = True # For baseline alignment
 
-        for token_type, text_segment in tokenized_line_segments:
-            if not text_segment: continue # Skip empty
-
-            segment_color = self.syntax_colors.get(token_type, self.syntax_colors[TOKEN_TYPE_DEFAULT])
-            
+        for text_segment, segment_color in segments:
             try:
-                self.font.render_to(line_surface, 
-                                    (current_x_offset, self.ascender),
-                                    text_segment, 
-                                    fgcolor=segment_color)
+                font.render_to(line_surface, 
+                               (current_x_offset, self.ascender),
+                               text_segment, 
+                               fgcolor=segment_color)
             except pg.error as e:
                 print(f"Pygame error rendering segment '{text_segment}': {e}")
                 # Fallback: render with default color or skip
-                self.font.render_to(line_surface, (current_x_offset, self.ascender), text_segment, fgcolor=self.syntax_colors[TOKEN_TYPE_DEFAULT])
+                font.render_to(line_surface, (current_x_offset, self.ascender), text_segment, fgcolor=self.syntax_colors[TOKEN_TYPE_DEFAULT])
             except Exception as e:
                 print(f"General error rendering segment '{text_segment}': {e}")
 
-            current_x_offset += self.get_string_width(text_segment)
+            current_x_offset += self.get_string_width(text_segment, font)
             
-        self.font.origin = False
+        font.origin = False
 
-        texture_data = pg.image.tostring(line_surface, "RGBA", True)
+        return pg.image.tostring(line_surface, "RGBA", True), total_width, surface_height
+
+    def upload_texture(self, texture_data, width, height):
+        """Creates a texture from RGBA bytes (rows flipped like pg.image.tostring(..., True)), returns its id."""
         tex_id = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, tex_id)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, surface_width, surface_height, 0, 
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, 
                      GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
         glBindTexture(GL_TEXTURE_2D, 0)
-
-        return tex_id, total_width, surface_height
+        return tex_id
 
     def render_text_to_texture(self, text_string: str, color_override=None):
         """
@@ -194,11 +233,105 @@ class TextRenderer:
 
         return tex_id, actual_text_width, surface_height # surface_height is self.line_height
     
-    def draw_text(self, text_texture_id, x, y, width, height):
-        """Draws a pre-rendered text texture at (x, y)."""
+    def layout_segments(self, colored_segments):
+        """Lays out (text_segment, color_rgb) tuples as a GlyphRun into the glyph atlas."""
+        starts = []
+        colors = []
+        pos = 0
+        for text, color in colored_segments:
+            starts.append(pos)
+            colors.append(color)
+            pos += len(text)
+        run = GlyphRun("".join(text for text, _ in colored_segments), starts, colors)
+        self._layout_run(run)
+        return run
+
+    def layout_line_segmented(self, tokenized_line_segments):
+        """Atlas counterpart of render_line_segmented_to_texture, takes (token_type, text_segment) tuples."""
+        return self.layout_line_packed("".join(text for _, text in tokenized_line_segments),
+                                       pack_tokens(tokenized_line_segments))
+
+    def layout_line_packed(self, line_text, packed_tokens):
+        """Atlas counterpart of render_line_packed_to_texture."""
+        starts, type_ids = packed_tokens
+        token_colors = self.token_colors
+        run = GlyphRun(line_text, starts, [token_colors[type_id] for type_id in type_ids])
+        self._layout_run(run)
+        return run
+
+    def layout_text(self, text_string, color_override=None):
+        """Atlas counterpart of render_text_to_texture."""
+        return self.layout_segments([(text_string, color_override or self.syntax_colors[TOKEN_TYPE_DEFAULT])])
+
+    def _layout_run(self, run):
+        for _ in range(2): # Retry once if the atlas filled up (and was reset) mid-line
+            generation = self.atlas.generation
+            quads = []
+            pen_x = 0.0
+            text, starts, colors = run.text, run.starts, run.colors
+            span = -1
+            next_start = 0 # Where the next color span begins
+            color = None
+            for i, (char, metric) in enumerate(zip(text, self.font.get_metrics(text) if text else ())):
+                while i >= next_start: # Entering the next span (skipping empty ones)
+                    span += 1
+                    rgb = colors[span]
+                    color = (rgb[0] / 255.0, rgb[1] / 255.0, rgb[2] / 255.0, 1.0)
+                    next_start = starts[span + 1] if span + 1 < len(starts) else len(text)
+                if not metric:
+                    continue
+                glyph = self.atlas.get_glyph(char, metric)
+                if glyph:
+                    s0, t0, s1, t1, left_bearing, cell_width = glyph
+                    x0 = int(round(pen_x)) - left_bearing
+                    quads.append((x0, x0 + cell_width, s0, t0, s1, t1, color))
+                pen_x += metric[4]
+            if self.atlas.generation == generation:
+                break
+        run.quads = quads
+        run.width = int(round(pen_x))
+        run.generation = self.atlas.generation
+
+    def draw_glyph_run(self, run, x, y, batch=None):
+        """
+        Draws a GlyphRun with its left edge at x and its top at y, using a single texture bind,
+        or adds its quads to a QuadBatch.
+        """
+        if run.generation != self.atlas.generation:
+            self._layout_run(run) # Atlas was reset since the run was laid out
+        if not run.quads:
+            return
+
+        bottom = y + self.line_height
+        if batch is not None:
+            texture_id = self.atlas.texture_id
+            for x0, x1, s0, t0, s1, t1, color in run.quads:
+                batch.add_quad(texture_id, x + x0, y, x + x1, bottom, s0, t0, s1, t1, color)
+            return
+
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.atlas.texture_id)
+        glBegin(GL_QUADS)
+        for x0, x1, s0, t0, s1, t1, color in run.quads:
+            glColor4f(*color)
+            glTexCoord2f(s0, t0); glVertex2f(x + x0, bottom) # Bottom-left
+            glTexCoord2f(s1, t0); glVertex2f(x + x1, bottom) # Bottom-right
+            glTexCoord2f(s1, t1); glVertex2f(x + x1, y)      # Top-right
+            glTexCoord2f(s0, t1); glVertex2f(x + x0, y)      # Top-left
+        glEnd()
+
+        glDisable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def draw_text(self, text_texture_id, x, y, width, height, batch=None):
+        """Draws a pre-rendered text texture at (x, y), or adds it to a QuadBatch."""
         if text_texture_id is None:
             return
 
+        if batch is not None:
+            batch.add_quad(text_texture_id, x, y, x + width, y + height)
+            return
+
         glEnable(GL_TEXTURE_2D)
         glBindTexture(GL_TEXTURE_2D, text_texture_id)
 
@@ -216,31 +349,69 @@ class TextRenderer:
         glDisable(GL_TEXTURE_2D)
         glBindTexture(GL_TEXTURE_2D, 0)
 
+    def get_char_advance(self, char, font=None):
+        """Advance of a single character in fractional pixels, measured once per character."""
+        advance = self._advances.get(char)
+        if advance is None:
+            metrics = (font or self.font).get_metrics(char)
+            # Each metric is a tuple: (min_x, max_x, min_y, max_y, horizontal_advance_x, vertical_advance_y)
+            advance = metrics[0][4] if metrics and metrics[0] else 0
+            self._advances[char] = advance
+        return advance
+
     def get_char_width(self, char):
         """Gets the advance width of a single character."""
         if not char or len(char) != 1:
             return 0
-        _surf, rect = self.font.render(char, fgcolor=(0,0,0))
-        return rect.width if rect else 0 # rect.width is advance
+        return int(round(self.get_char_advance(char)))
 
-    def get_string_width(self, text_string: str) -> int:
-        """Calculates the total advance width of a string using font metrics."""
+    def get_string_width(self, text_string: str, font=None) -> int:
+        """
+        Calculates the total advance width of a string from the cached per-character advances.
+        font measures characters not seen yet, off the main thread (see open_font).
+        """
         if not text_string:
             return 0
-        
-        metrics = self.font.get_metrics(text_string)
-        if not metrics:
-            # This can happen for strings with no renderable glyphs or just spaces.
-            # Fallback to get_rect for such cases, as it considers the space taken.
-            return self.font.get_rect(text_string).width
+        # Only printable ASCII: tabs and other control characters have no glyph and no advance
+        if self.monospace_advance is not None and text_string.isascii() and text_string.isprintable():
+            return int(round(len(text_string) * self.monospace_advance))
 
+        advances = self._advances
         total_advance = 0
-        for metric in metrics:
-            if metric: # Each metric is a tuple: (min_x, max_x, min_y, max_y, horizontal_advance_x, vertical_advance_y)
-                total_advance += metric[4]  # horizontal_advance_x
+        for char in text_string:
+            advance = advances.get(char)
+            total_advance += advance if advance is not None else self.get_char_advance(char, font)
         return int(round(total_advance))
 
+    def get_column_x(self, line_text, col):
+        """
+        x offset of column col (clamped to the line's length) from the start of the line,
+        the same as get_string_width(line_text[:col]). O(1) for printable ASCII in a monospace
+        font; otherwise the line's prefix sums are built once and kept while it's in use.
+        """
+        col = max(0, min(col, len(line_text)))
+        if self.monospace_advance is not None and line_text.isascii() and line_text.isprintable():
+            return int(round(col * self.monospace_advance))
+
+        offsets = self._column_offsets.get(line_text)
+        if offsets is None:
+            offsets = [0]
+            total_advance = 0
+            for char in line_text:
+                total_advance += self.get_char_advance(char)
+                offsets.append(int(round(total_advance)))
+            self._column_offsets[line_text] = offsets
+            if len(self._column_offsets) > COLUMN_OFFSETS_CACHE_SIZE:
+                self._column_offsets.popitem(last=False)
+        else:
+            self._column_offsets.move_to_end(line_text)
+        return offsets[col]
+
     def cleanup_texture(self, texture_id):
         """Deletes an OpenGL texture."""
         if texture_id is not None:
-            glDeleteTextures(1, [texture_id])
\ No newline at end of file
+            glDeleteTextures(1, [texture_id])
+
+    def cleanup(self):
+        """Deletes the glyph atlas texture."""
+        self.atlas.cleanup()
\ No newline at end of file
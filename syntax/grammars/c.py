@@ -0,0 +1,54 @@
+from syntax.highlighter import (
+    TOKEN_TYPE_KEYWORD, TOKEN_TYPE_COMMENT, TOKEN_TYPE_STRING, TOKEN_TYPE_NUMBER,
+    TOKEN_TYPE_FUNCTION_CALL, TOKEN_TYPE_DECORATOR, TOKEN_TYPE_BUILTIN,
+)
+
+C_TYPES = {
+    'void', 'char', 'short', 'int', 'long', 'float', 'double', 'signed', 'unsigned',
+    'bool', '_Bool', 'size_t', 'ssize_t', 'ptrdiff_t', 'intptr_t', 'uintptr_t',
+    'int8_t', 'int16_t', 'int32_t', 'int64_t', 'uint8_t', 'uint16_t', 'uint32_t', 'uint64_t',
+    'FILE'
+}
+CONTROL_FLOW_KEYWORDS = r'\b(if|else|for|while|do|switch|case|default|break|continue|return|goto)\b'
+DECLARATION_KEYWORDS = r'\b(struct|union|enum|typedef)\b'
+MODIFIER_KEYWORDS = r'\b(const|static|extern|volatile|register|inline|restrict|auto)\b'
+OTHER_KEYWORDS = r'\b(sizeof|NULL|true|false)\b'
+
+# Block comments still open at the end of a line, and the rest of them on later lines
+_OPEN_BLOCK_COMMENT = r'/\*(?:(?!\*/).)*$'
+_CLOSE_BLOCK_COMMENT = r'(?:(?!\*/).)*\*/'
+
+CONTINUATIONS = {
+    _OPEN_BLOCK_COMMENT: _CLOSE_BLOCK_COMMENT,
+}
+
+RULES = [
+    # Comments
+    (TOKEN_TYPE_COMMENT, r'//.*'),
+    (TOKEN_TYPE_COMMENT, r'/\*.*?\*/'),
+    (TOKEN_TYPE_COMMENT, _OPEN_BLOCK_COMMENT), # ...still open at the end of the line
+
+    # Preprocessor directives
+    (TOKEN_TYPE_DECORATOR, r'^\s*#\s*\w+'),
+    (TOKEN_TYPE_STRING, r'(?<=include)\s*<[^>]*>'), # #include <header.h>
+
+    # Strings and character literals
+    (TOKEN_TYPE_STRING, r'[LuU]?8?"(?:\\.|[^"\\])*"'),
+    (TOKEN_TYPE_STRING, r'[LuU]?\'(?:\\.|[^\'\\])*\''),
+
+    # Keywords
+    ("keyword.declaration", DECLARATION_KEYWORDS),
+    ("keyword.control", CONTROL_FLOW_KEYWORDS),
+    ("keyword.modifier", MODIFIER_KEYWORDS),
+    (TOKEN_TYPE_KEYWORD, OTHER_KEYWORDS),
+
+    # Types
+    (TOKEN_TYPE_BUILTIN, r'\b(' + '|'.join(C_TYPES) + r')\b'),
+
+    # Function Calls and definitions
+    (TOKEN_TYPE_FUNCTION_CALL, r'\b([A-Za-z_]\w*)\s*(?=\()'),
+
+    # Numbers
+    (TOKEN_TYPE_NUMBER, r'\b0[xX][0-9a-fA-F]+[uUlL]*\b'), # Hex
+    (TOKEN_TYPE_NUMBER, r'\b\d+\.?\d*([eE][-+]?\d+)?[uUlLfF]*\b'), # Decimal, octal, float, scientific
+]
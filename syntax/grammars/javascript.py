@@ -0,0 +1,70 @@
+from syntax.highlighter import (
+    TOKEN_TYPE_KEYWORD, TOKEN_TYPE_COMMENT, TOKEN_TYPE_STRING, TOKEN_TYPE_FSTRING_BG,
+    TOKEN_TYPE_NUMBER, TOKEN_TYPE_FUNCTION_CALL, TOKEN_TYPE_FUNCTION_DEF, TOKEN_TYPE_CLASS_DEF,
+    TOKEN_TYPE_DECORATOR, TOKEN_TYPE_BUILTIN, TOKEN_TYPE_SELF_PARAM,
+)
+
+JAVASCRIPT_BUILTINS = {
+    'Array', 'Boolean', 'Date', 'Error', 'JSON', 'Map', 'Math', 'Number', 'Object',
+    'Promise', 'Proxy', 'Reflect', 'RegExp', 'Set', 'String', 'Symbol', 'WeakMap',
+    'WeakSet', 'console', 'document', 'globalThis', 'isFinite', 'isNaN', 'parseFloat',
+    'parseInt', 'window', 'require', 'module', 'exports'
+}
+CONTROL_FLOW_KEYWORDS = r'\b(if|else|for|while|do|switch|case|default|break|continue|return|throw|try|catch|finally|yield|await|async)\b'
+IMPORT_KEYWORDS = r'\b(import|export|from|as)\b'
+DECLARATION_KEYWORDS = r'\b(function|class|const|let|var|extends|static|get|set)\b'
+OPERATOR_KEYWORDS = r'\b(in|of|instanceof|typeof|new|delete|void)\b'
+CONSTANT_KEYWORDS = r'\b(true|false|null|undefined|NaN|Infinity)\b'
+
+# Block comments and template literals still open at the end of a line, and the rest of them on later lines
+_OPEN_BLOCK_COMMENT = r'/\*(?:(?!\*/).)*$'
+_CLOSE_BLOCK_COMMENT = r'(?:(?!\*/).)*\*/'
+_OPEN_TEMPLATE = r'`(?:\\.|[^`\\])*\\?$'
+_CLOSE_TEMPLATE = r'(?:\\.|[^`\\])*`'
+
+CONTINUATIONS = {
+    _OPEN_BLOCK_COMMENT: _CLOSE_BLOCK_COMMENT,
+    _OPEN_TEMPLATE: _CLOSE_TEMPLATE,
+}
+
+RULES = [
+    # Comments
+    (TOKEN_TYPE_COMMENT, r'//.*'),
+    (TOKEN_TYPE_COMMENT, r'/\*.*?\*/'),
+    (TOKEN_TYPE_COMMENT, _OPEN_BLOCK_COMMENT), # ...still open at the end of the line
+
+    # Decorators
+    (TOKEN_TYPE_DECORATOR, r'@\w+(\.\w+)*'),
+
+    # Strings
+    (TOKEN_TYPE_FSTRING_BG, r'`(?:\\.|[^`\\])*`'), # Template literal
+    (TOKEN_TYPE_FSTRING_BG, _OPEN_TEMPLATE),       # ...still open at the end of the line
+    (TOKEN_TYPE_STRING, r'"(?:\\.|[^"\\])*"'),
+    (TOKEN_TYPE_STRING, r'\'(?:\\.|[^\'\\])*\''),
+
+    # Keywords
+    ("keyword.declaration", DECLARATION_KEYWORDS),
+    ("keyword.control", CONTROL_FLOW_KEYWORDS),
+    ("keyword.modifier", IMPORT_KEYWORDS),
+    (TOKEN_TYPE_KEYWORD, OPERATOR_KEYWORDS),
+    (TOKEN_TYPE_KEYWORD, CONSTANT_KEYWORDS),
+
+    # Function and Class Definitions
+    (TOKEN_TYPE_FUNCTION_DEF, r'(?<=\bfunction)\s+[A-Za-z_$][\w$]*'), # Name in 'function foo('
+    (TOKEN_TYPE_CLASS_DEF, r'(?<=\bclass)\s+[A-Za-z_$][\w$]*'),       # Name in 'class Foo'
+
+    # this/super
+    (TOKEN_TYPE_SELF_PARAM, r'\b(this|super)\b'),
+
+    # Built-ins
+    (TOKEN_TYPE_BUILTIN, r'\b(' + '|'.join(JAVASCRIPT_BUILTINS) + r')\b'),
+
+    # Function Calls
+    (TOKEN_TYPE_FUNCTION_CALL, r'\b([A-Za-z_$][\w$]*)\s*(?=\()'),
+
+    # Numbers
+    (TOKEN_TYPE_NUMBER, r'\b0[xX][0-9a-fA-F_]+n?\b'), # Hex
+    (TOKEN_TYPE_NUMBER, r'\b0[oO][0-7_]+n?\b'),       # Octal
+    (TOKEN_TYPE_NUMBER, r'\b0[bB][01_]+n?\b'),        # Binary
+    (TOKEN_TYPE_NUMBER, r'\b\d[\d_]*\.?[\d_]*([eE][-+]?\d+)?n?\b'), # Decimal, float, scientific, BigInt
+]
@@ -0,0 +1,8 @@
+from syntax.highlighter import TOKEN_TYPE_KEYWORD, TOKEN_TYPE_STRING, TOKEN_TYPE_NUMBER, TOKEN_TYPE_BUILTIN
+
+RULES = [
+    (TOKEN_TYPE_BUILTIN, r'"(?:\\.|[^"\\])*"(?=\s*:)'), # Object keys
+    (TOKEN_TYPE_STRING, r'"(?:\\.|[^"\\])*"'),
+    (TOKEN_TYPE_KEYWORD, r'\b(true|false|null)\b'),
+    (TOKEN_TYPE_NUMBER, r'-?\b\d+(\.\d+)?([eE][-+]?\d+)?\b'),
+]
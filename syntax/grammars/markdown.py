@@ -0,0 +1,22 @@
+from syntax.highlighter import (
+    TOKEN_TYPE_COMMENT, TOKEN_TYPE_STRING, TOKEN_TYPE_FUNCTION_CALL, TOKEN_TYPE_FUNCTION_DEF,
+)
+
+# Fenced code blocks: the opening fence line, and the lines up to and including the closing fence
+_OPEN_FENCE = r'^\s*(```|~~~).*$'
+_CLOSE_FENCE = r'\s*(```|~~~).*$'
+
+CONTINUATIONS = {
+    _OPEN_FENCE: _CLOSE_FENCE,
+}
+
+RULES = [
+    (TOKEN_TYPE_STRING, _OPEN_FENCE),                   # Fenced code block
+    ("keyword.declaration", r'^#{1,6}\s.*'),            # Headings
+    (TOKEN_TYPE_COMMENT, r'^\s*>.*'),                   # Block quotes
+    ("keyword.modifier", r'^\s*([-*+]|\d+[.)])(?=\s)'), # List markers
+    (TOKEN_TYPE_STRING, r'`[^`]+`'),                    # Inline code
+    (TOKEN_TYPE_FUNCTION_CALL, r'!?\[[^\]]*\]\([^)]*\)'), # Links and images
+    (TOKEN_TYPE_FUNCTION_DEF, r'(\*\*|__)(?=\S).+?(?<=\S)\1'), # Bold
+    ("keyword.control", r'(?<![*\w])([*_])(?=\S)[^*_]+?(?<=\S)\1(?![*\w])'), # Italic
+]
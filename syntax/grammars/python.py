@@ -0,0 +1,95 @@
+from syntax.highlighter import (
+    TOKEN_TYPE_KEYWORD, TOKEN_TYPE_COMMENT, TOKEN_TYPE_STRING, TOKEN_TYPE_FSTRING_BG,
+    TOKEN_TYPE_NUMBER, TOKEN_TYPE_FUNCTION_CALL, TOKEN_TYPE_FUNCTION_DEF, TOKEN_TYPE_CLASS_DEF,
+    TOKEN_TYPE_DECORATOR, TOKEN_TYPE_BUILTIN, TOKEN_TYPE_MAGIC_METHOD, TOKEN_TYPE_SELF_PARAM,
+)
+
+# Python Built-ins (a selection)
+PYTHON_BUILTINS = {
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 'callable',
+    'chr', 'classmethod', 'compile', 'complex', 'delattr', 'dict', 'dir', 'divmod',
+    'enumerate', 'eval', 'exec', 'filter', 'float', 'format', 'frozenset', 'getattr',
+    'globals', 'hasattr', 'hash', 'help', 'hex', 'id', 'input', 'int', 'isinstance',
+    'issubclass', 'iter', 'len', 'list', 'locals', 'map', 'max', 'memoryview', 'min',
+    'next', 'object', 'oct', 'open', 'ord', 'pow', 'print', 'property', 'range',
+    'repr', 'reversed', 'round', 'set', 'setattr', 'slice', 'sorted', 'staticmethod',
+    'str', 'sum', 'super', 'tuple', 'type', 'vars', 'zip', '__import__'
+}
+# Python "Magic" methods start and end with double underscores
+CONTROL_FLOW_KEYWORDS = r'\b(if|elif|else|for|while|try|except|finally|return|yield|pass|break|continue|with|async|await)\b'
+IMPORT_KEYWORDS = r'\b(import|from|as)\b'
+DECLARATION_KEYWORDS = r'\b(def|class|lambda)\b'
+OPERATOR_KEYWORDS = r'\b(in|is|not|and|or)\b' # logical/membership operators
+CONSTANT_KEYWORDS = r'\b(True|False|None)\b' # language constants
+OTHER_KEYWORDS = r'\b(global|nonlocal|assert|del)\b'
+
+# Triple-quoted strings still open at the end of a line, and the rest of them on later lines
+_CLOSE_TRIPLE_DOUBLE = r'(?:\\.|(?!""")[^\\])*"""'
+_CLOSE_TRIPLE_SINGLE = r"(?:\\.|(?!''')[^\\])*'''"
+_OPEN_TRIPLE_DOUBLE_FSTRING = r'[fF][rR]?"""(?:\\.|(?!""")[^\\])*\\?$'
+_OPEN_TRIPLE_SINGLE_FSTRING = r"[fF][rR]?'''(?:\\.|(?!''')[^\\])*\\?$"
+_OPEN_TRIPLE_DOUBLE_STRING = r'[rR]?"""(?:\\.|(?!""")[^\\])*\\?$'
+_OPEN_TRIPLE_SINGLE_STRING = r"[rR]?'''(?:\\.|(?!''')[^\\])*\\?$"
+
+CONTINUATIONS = {
+    _OPEN_TRIPLE_DOUBLE_FSTRING: _CLOSE_TRIPLE_DOUBLE,
+    _OPEN_TRIPLE_SINGLE_FSTRING: _CLOSE_TRIPLE_SINGLE,
+    _OPEN_TRIPLE_DOUBLE_STRING: _CLOSE_TRIPLE_DOUBLE,
+    _OPEN_TRIPLE_SINGLE_STRING: _CLOSE_TRIPLE_SINGLE,
+}
+
+RULES = [
+    # 1. Comments (highest priority)
+    (TOKEN_TYPE_COMMENT, r'#.*'),
+
+    # 2. Decorators (before function/class defs)
+    (TOKEN_TYPE_DECORATOR, r'@\w+(\.\w+)*'), # Matches @decorator or @module.decorator
+
+    # 3. Strings
+    (TOKEN_TYPE_FSTRING_BG, r'[fF][rR]?"""(?:.|\n)*?"""'), # Triple-quoted f-string
+    (TOKEN_TYPE_FSTRING_BG, _OPEN_TRIPLE_DOUBLE_FSTRING),  # ...still open at the end of the line
+    (TOKEN_TYPE_FSTRING_BG, r'[fF][rR]?"(?:\\.|[^"\\])*"'),  # Double-quoted f-string
+    (TOKEN_TYPE_FSTRING_BG, r'[fF][rR]?\'\'\'(?:.|\n)*?\'\'\''), # Triple-quoted f-string
+    (TOKEN_TYPE_FSTRING_BG, _OPEN_TRIPLE_SINGLE_FSTRING),  # ...still open at the end of the line
+    (TOKEN_TYPE_FSTRING_BG, r'[fF][rR]?\'(?:\\.|[^\'\\])*\''),  # Single-quoted f-string
+
+    (TOKEN_TYPE_STRING, r'[rR]?"""(?:.|\n)*?"""'), # Raw Triple-quoted
+    (TOKEN_TYPE_STRING, _OPEN_TRIPLE_DOUBLE_STRING), # ...still open at the end of the line
+    (TOKEN_TYPE_STRING, r'[rR]?"(?:\\.|[^"\\])*"'),  # Raw Double-quoted
+    (TOKEN_TYPE_STRING, r'[rR]?\'\'\'(?:.|\n)*?\'\'\''), # Raw Triple-quoted
+    (TOKEN_TYPE_STRING, _OPEN_TRIPLE_SINGLE_STRING), # ...still open at the end of the line
+    (TOKEN_TYPE_STRING, r'[rR]?\'(?:\\.|[^\'\\])*\''),  # Raw Single-quoted
+
+    # 4. Keywords (split into categories for potential different styling)
+    ("keyword.declaration", DECLARATION_KEYWORDS),
+    ("keyword.control", CONTROL_FLOW_KEYWORDS),
+    ("keyword.modifier", IMPORT_KEYWORDS),
+    (TOKEN_TYPE_KEYWORD, OPERATOR_KEYWORDS), # General keyword for now
+    (TOKEN_TYPE_KEYWORD, CONSTANT_KEYWORDS), # General keyword for now
+    (TOKEN_TYPE_KEYWORD, OTHER_KEYWORDS),    # General keyword for now
+
+    # 5. Function and Class Definitions
+    (TOKEN_TYPE_FUNCTION_DEF, r'\b([a-zA-Z_]\w*)\s*(?=\()'), # An identifier followed by (
+    (TOKEN_TYPE_CLASS_DEF, r'\b([A-Z]\w*)\b(?=\s*[:\(])'),   # CapWord identifier before : or (
+
+    # 6. Magic Methods and self/cls
+    (TOKEN_TYPE_MAGIC_METHOD, r'\b__\w+__\b'),
+    (TOKEN_TYPE_SELF_PARAM, r'\b(self|cls)\b(?=\s*[,):])'),
+
+
+    # 7. Built-ins
+    (TOKEN_TYPE_BUILTIN, r'\b(' + '|'.join(PYTHON_BUILTINS) + r')\b'),
+
+    # 8. Function Calls (general identifier followed by '()')
+    (TOKEN_TYPE_FUNCTION_CALL, r'\b([a-zA-Z_]\w*)\s*(?=\()'),
+
+    # 9. Numbers
+    (TOKEN_TYPE_NUMBER, r'\b0[xX][0-9a-fA-F]+\b'), # Hex
+    (TOKEN_TYPE_NUMBER, r'\b0[oO][0-7]+\b'),     # Octal
+    (TOKEN_TYPE_NUMBER, r'\b0[bB][01]+\b'),      # Binary
+    (TOKEN_TYPE_NUMBER, r'\b\d+\.?\d*([eE][-+]?\d+)?\b'), # Decimal, float, scientific
+
+    # Operators and Braces (could be TOKEN_TYPE_DEFAULT if not styled distinctly)
+    # (TOKEN_TYPE_OPERATOR, r'[+\-*/%=<>&|^~]'),
+    # (TOKEN_TYPE_BRACE, r'[(){}\[\]]'),
+]
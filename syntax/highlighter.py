@@ -1,4 +1,8 @@
 import re
+import threading
+import importlib
+from array import array
+from collections import OrderedDict
 
 # Token types
 TOKEN_TYPE_DEFAULT = "default"
@@ -40,88 +44,59 @@ SYNTAX_COLORS = {
     TOKEN_TYPE_SELF_PARAM: (86, 156, 214),    # 'self', 'cls' (Blue, like variables/builtins)
 }
 
+# Token type names by id, for packed token arrays (see pack_tokens). Types missing here pack as default.
+TOKEN_TYPES = tuple(SYNTAX_COLORS)
+TOKEN_TYPE_IDS = {token_type: i for i, token_type in enumerate(TOKEN_TYPES)}
+
 # My personal overrides, remove this later
 SYNTAX_COLORS[TOKEN_TYPE_KEYWORD] = SYNTAX_COLORS["keyword.control"] # Default keyword color
 SYNTAX_COLORS[TOKEN_TYPE_DEFAULT] = (212, 212, 212) # Common VSCode default text
 SYNTAX_COLORS[TOKEN_TYPE_OPERATOR] = SYNTAX_COLORS[TOKEN_TYPE_DEFAULT] # Operators often default
 SYNTAX_COLORS[TOKEN_TYPE_BRACE] = SYNTAX_COLORS[TOKEN_TYPE_DEFAULT] # Braces often default
 
-# Python Built-ins (a selection)
-PYTHON_BUILTINS = {
-    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 'callable',
-    'chr', 'classmethod', 'compile', 'complex', 'delattr', 'dict', 'dir', 'divmod',
-    'enumerate', 'eval', 'exec', 'filter', 'float', 'format', 'frozenset', 'getattr',
-    'globals', 'hasattr', 'hash', 'help', 'hex', 'id', 'input', 'int', 'isinstance',
-    'issubclass', 'iter', 'len', 'list', 'locals', 'map', 'max', 'memoryview', 'min',
-    'next', 'object', 'oct', 'open', 'ord', 'pow', 'print', 'property', 'range',
-    'repr', 'reversed', 'round', 'set', 'setattr', 'slice', 'sorted', 'staticmethod',
-    'str', 'sum', 'super', 'tuple', 'type', 'vars', 'zip', '__import__'
-}
-# Python "Magic" methods start and end with double underscores
-CONTROL_FLOW_KEYWORDS = r'\b(if|elif|else|for|while|try|except|finally|return|yield|pass|break|continue|with|async|await)\b'
-IMPORT_KEYWORDS = r'\b(import|from|as)\b'
-DECLARATION_KEYWORDS = r'\b(def|class|lambda)\b'
-OPERATOR_KEYWORDS = r'\b(in|is|not|and|or)\b' # logical/membership operators
-CONSTANT_KEYWORDS = r'\b(True|False|None)\b' # language constants
-OTHER_KEYWORDS = r'\b(global|nonlocal|assert|del)\b'
-
-PYTHON_SYNTAX_RULES = [
-    # 1. Comments (highest priority)
-    (TOKEN_TYPE_COMMENT, re.compile(r'#.*')),
-
-    # 2. Decorators (before function/class defs)
-    (TOKEN_TYPE_DECORATOR, re.compile(r'@\w+(\.\w+)*')), # Matches @decorator or @module.decorator
-
-    # 3. Strings
-    (TOKEN_TYPE_FSTRING_BG, re.compile(r'[fF][rR]?"""(?:.|\n)*?"""')), # Triple-quoted f-string
-    (TOKEN_TYPE_FSTRING_BG, re.compile(r'[fF][rR]?"(?:\\.|[^"\\])*"')),  # Double-quoted f-string
-    (TOKEN_TYPE_FSTRING_BG, re.compile(r'[fF][rR]?\'\'\'(?:.|\n)*?\'\'\'')), # Triple-quoted f-string
-    (TOKEN_TYPE_FSTRING_BG, re.compile(r'[fF][rR]?\'(?:\\.|[^"\'])*\'')),  # Single-quoted f-string
-    
-    (TOKEN_TYPE_STRING, re.compile(r'[rR]?"""(?:.|\n)*?"""')), # Raw Triple-quoted
-    (TOKEN_TYPE_STRING, re.compile(r'[rR]?"(?:\\.|[^"\\])*"')),  # Raw Double-quoted
-    (TOKEN_TYPE_STRING, re.compile(r'[rR]?\'\'\'(?:.|\n)*?\'\'\'')), # Raw Triple-quoted
-    (TOKEN_TYPE_STRING, re.compile(r'[rR]?\'(?:\\.|[^"\'])*\'')),  # Raw Single-quoted
-
-    # 4. Keywords (split into categories for potential different styling)
-    ("keyword.declaration", re.compile(DECLARATION_KEYWORDS)),
-    ("keyword.control", re.compile(CONTROL_FLOW_KEYWORDS)),
-    ("keyword.modifier", re.compile(IMPORT_KEYWORDS)),
-    (TOKEN_TYPE_KEYWORD, re.compile(OPERATOR_KEYWORDS)), # General keyword for now
-    (TOKEN_TYPE_KEYWORD, re.compile(CONSTANT_KEYWORDS)), # General keyword for now
-    (TOKEN_TYPE_KEYWORD, re.compile(OTHER_KEYWORDS)),    # General keyword for now
-
-    # 5. Function and Class Definitions
-    (TOKEN_TYPE_FUNCTION_DEF, re.compile(r'\b([a-zA-Z_]\w*)\s*(?=\()')), # An identifier followed by (
-    (TOKEN_TYPE_CLASS_DEF, re.compile(r'\b([A-Z]\w*)\b(?=\s*[:\(])')),   # CapWord identifier before : or (
-
-    # 6. Magic Methods and self/cls
-    (TOKEN_TYPE_MAGIC_METHOD, re.compile(r'\b__\w+__\b')),
-    (TOKEN_TYPE_SELF_PARAM, re.compile(r'\b(self|cls)\b(?=\s*[,):])')),
-
-
-    # 7. Built-ins
-    (TOKEN_TYPE_BUILTIN, re.compile(r'\b(' + '|'.join(PYTHON_BUILTINS) + r')\b')),
-
-    # 8. Function Calls (general identifier followed by '()')
-    (TOKEN_TYPE_FUNCTION_CALL, re.compile(r'\b([a-zA-Z_]\w*)\s*(?=\()')),
-
-    # 9. Numbers
-    (TOKEN_TYPE_NUMBER, re.compile(r'\b0[xX][0-9a-fA-F]+\b')), # Hex
-    (TOKEN_TYPE_NUMBER, re.compile(r'\b0[oO][0-7]+\b')),     # Octal
-    (TOKEN_TYPE_NUMBER, re.compile(r'\b0[bB][01]+\b')),      # Binary
-    (TOKEN_TYPE_NUMBER, re.compile(r'\b\d+\.?\d*([eE][-+]?\d+)?\b')), # Decimal, float, scientific
-    
-    # Operators and Braces (could be TOKEN_TYPE_DEFAULT if not styled distinctly)
-    # (TOKEN_TYPE_OPERATOR, re.compile(r'[+\-*/%=<>&|^~]')),
-    # (TOKEN_TYPE_BRACE, re.compile(r'[(){}\[\]]')),
-]
-
-LANGUAGE_RULES_MAP = {
-    "py": {"rules": PYTHON_SYNTAX_RULES, "name": "Python"},
-    # "js": {"rules": JAVASCRIPT_SYNTAX_RULES, "name": "JavaScript"}, # TODO if i feel like it
-}
+# Lines only ever get tokenized one at a time, so constructs spanning lines (triple-quoted
+# strings, block comments) are split in two: a rule matching the construct's start when it's
+# still open at the end of the line, and a pattern matching the rest of it from the start of a
+# later line. LINE_CONTINUATIONS maps each such rule's pattern to its closing pattern, it's
+# filled in as grammars are compiled.
+LINE_CONTINUATIONS = {}
+
+# Languages by lowercase file extension: {"name": language name, "grammar": module}. A grammar
+# module (see syntax/grammars) declares RULES, (token_type, regex) pairs in priority order, and
+# CONTINUATIONS, opener regex -> closing regex. It's only imported and compiled the first time
+# a file of its language is opened, see register_language.
+LANGUAGE_RULES_MAP = {}
+_compiled_grammars = {} # grammar module -> compiled rules, kept so the rule list ids stay unique
+_grammar_lock = threading.Lock()
+
+
+def register_language(name, extensions, grammar_module):
+    """Makes files with these extensions highlight with grammar_module's rules, e.g. "syntax.grammars.python"."""
+    for extension in extensions:
+        LANGUAGE_RULES_MAP[extension.lower()] = {"name": name, "grammar": grammar_module}
 
+register_language("Python", ("py", "pyw", "pyi"), "syntax.grammars.python")
+register_language("JavaScript", ("js", "mjs", "cjs", "jsx"), "syntax.grammars.javascript")
+register_language("C", ("c", "h"), "syntax.grammars.c")
+register_language("JSON", ("json",), "syntax.grammars.json")
+register_language("Markdown", ("md", "markdown"), "syntax.grammars.markdown")
+
+
+def load_grammar(grammar_module):
+    """Compiled rules of grammar_module, importing and compiling it on first use. None if it fails to load."""
+    with _grammar_lock:
+        if grammar_module in _compiled_grammars:
+            return _compiled_grammars[grammar_module]
+        try:
+            grammar = importlib.import_module(grammar_module)
+            rules = [(token_type, re.compile(pattern)) for token_type, pattern in grammar.RULES]
+            for opener, closer in getattr(grammar, "CONTINUATIONS", {}).items():
+                LINE_CONTINUATIONS[re.compile(opener)] = re.compile(closer)
+        except Exception as e:
+            print(f"Error loading grammar {grammar_module}: {e}")
+            rules = None
+        _compiled_grammars[grammar_module] = rules
+        return rules
 
 def get_rules_for_extension(file_extension):
     """Returns the syntax rules and language name for a given file extension (e.g., 'py')."""
@@ -129,56 +104,415 @@ def get_rules_for_extension(file_extension):
         return None, None
     lang_config = LANGUAGE_RULES_MAP.get(file_extension.lower())
     if lang_config:
-        return lang_config["rules"], lang_config["name"]
+        rules = load_grammar(lang_config["grammar"])
+        if rules:
+            return rules, lang_config["name"]
     return None, None
 
-def highlight_line(line_text, rules):
+def __getattr__(name):
+    # PYTHON_SYNTAX_RULES is compiled on first use like every other grammar
+    if name == "PYTHON_SYNTAX_RULES":
+        return load_grammar("syntax.grammars.python")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Tokenized lines kept by tokenize_line, least recently used ones are dropped beyond this
+TOKEN_CACHE_SIZE = 4096
+
+
+class TokenCache:
+    """
+    tokenize_line results keyed by what they depend on, (line text, id(rules), start state),
+    so a line rendered again (after an undo, a cache flush, on a duplicate line) isn't
+    tokenized again. Least recently used entries go once there are more than max_entries.
+    Thread safe, the renderer's prefetch worker fills it too.
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (tokens, end_state)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Shared by every caller of tokenize_line/highlight_line
+token_cache = TokenCache()
+
+def highlight_line(line_text, rules, state=None):
     """
     Applies syntax rules to a line of text and returns a list of (token_type, text_segment) tuples.
     This is a simple greedy approach; order of rules matters.
+    state is the line's start state (see tokenize_line), None outside any multi-line construct.
     """
-    if not line_text:
-        return [(TOKEN_TYPE_DEFAULT, "")]
+    return unpack_tokens(line_text, tokenize_line(line_text, rules, state)[0])
 
-    tokens = []
+def tokenize_line(line_text, rules, state=None):
+    """
+    Like highlight_line, but returns (packed tokens, end_state), tokens packed as by
+    pack_tokens. A state is None, or the (token_type, closing pattern) of a construct
+    left open (see LINE_CONTINUATIONS); a line's end state is the start state of the next one.
+    Results come from token_cache when the line was tokenized before; don't modify them.
+    """
+    key = (line_text, id(rules), state) # Rule lists are compiled once and kept, their ids stay unique
+    result = token_cache.get(key)
+    if result is None:
+        result = _tokenize_line(line_text, rules, state)
+        token_cache.put(key, result)
+    return result
+
+def _tokenize_line(line_text, rules, state):
+    packed = _new_packed(line_text)
     current_pos = 0
+    if state is not None:
+        token_type, close_pattern = state
+        match = close_pattern.match(line_text)
+        _append_token(packed, 0, token_type)
+        if match is None: # The whole line is still inside the construct
+            return packed, state
+        current_pos = match.end()
+    elif not line_text:
+        _append_token(packed, 0, TOKEN_TYPE_DEFAULT)
+        return packed, None
+
+    end_state = _tokenize_from(line_text, rules, current_pos, packed)
+    if not packed[0]: # Should only happen if line_text was empty and was handled, or if it's all spaces
+        _append_token(packed, 0, TOKEN_TYPE_DEFAULT)
+    return packed, end_state
+
+def _tokenize_from(line_text, rules, current_pos, packed):
+    """
+    Appends the tokens of line_text[current_pos:] to packed tokens and returns the line's end state.
+
+    Each rule's next match is remembered and only searched for again once the tokens
+    emitted so far have moved past its start, so a line costs about one scan per rule
+    instead of one per rule for every token.
+    """
     line_len = len(line_text)
+    end_state = None
+
+    # Next match of each rule at or after current_pos, None once a rule has no more matches
+    next_matches = [pattern.search(line_text, current_pos) for _, pattern in rules]
 
     while current_pos < line_len:
-        best_match_this_iteration = None # (match_object, token_type)
+        best_index = None
+        best_match = None
 
         # Find the best (earliest starting, then longest) match from current_pos
-        for token_type, pattern in rules:
-            match = pattern.search(line_text, current_pos) # Search from current_pos onwards
-            if match:
-                if best_match_this_iteration is None:
-                    best_match_this_iteration = (match, token_type)
-                else:
-                    # If this match starts earlier, it's better
-                    if match.start() < best_match_this_iteration[0].start():
-                        best_match_this_iteration = (match, token_type)
-                    # If it starts at the same place, prefer longer match
-                    elif match.start() == best_match_this_iteration[0].start() and \
-                         match.end() > best_match_this_iteration[0].end():
-                        best_match_this_iteration = (match, token_type)
-        
-        if best_match_this_iteration:
-            match, token_type = best_match_this_iteration
-            match_start, match_end = match.span()
-
-            # If there's a gap between current_pos and this match_start, it's default text
-            if match_start > current_pos:
-                tokens.append((TOKEN_TYPE_DEFAULT, line_text[current_pos:match_start]))
-            
-            # Add the matched token
-            tokens.append((token_type, match.group(0)))
-            current_pos = match_end
-        else:
+        for i, match in enumerate(next_matches):
+            if match is None:
+                continue
+            if match.start() < current_pos: # Stale, overlapped by an emitted token
+                match = rules[i][1].search(line_text, current_pos)
+                next_matches[i] = match
+                if match is None:
+                    continue
+            if best_match is None or match.start() < best_match.start() or \
+                    (match.start() == best_match.start() and match.end() > best_match.end()):
+                best_index, best_match = i, match
+
+        if best_match is None:
             # No more rule matches found for the rest of the line
-            if current_pos < line_len:
-                tokens.append((TOKEN_TYPE_DEFAULT, line_text[current_pos:]))
-            current_pos = line_len
-            
-    if not tokens: # Should only happen if line_text was empty and was handled, or if it's all spaces
-        return [(TOKEN_TYPE_DEFAULT, line_text)]
-    return tokens
\ No newline at end of file
+            _append_token(packed, current_pos, TOKEN_TYPE_DEFAULT)
+            break
+
+        match_start, match_end = best_match.span()
+
+        # If there's a gap between current_pos and this match_start, it's default text
+        if match_start > current_pos:
+            _append_token(packed, current_pos, TOKEN_TYPE_DEFAULT)
+
+        # Add the matched token
+        token_type, pattern = rules[best_index]
+        _append_token(packed, match_start, token_type)
+        if pattern in LINE_CONTINUATIONS: # Runs to the end of the line and carries over
+            end_state = (token_type, LINE_CONTINUATIONS[pattern])
+        if match_end == match_start: # Empty match, step over a character so the scan moves on
+            next_matches[best_index] = pattern.search(line_text, match_end + 1)
+        current_pos = match_end
+
+    return end_state
+
+
+# Lines start_state scans on the spot to reach the line asked for; further than that it
+# answers with a provisional None state and leaves the scan to advance()
+LINE_STATE_SYNC_SCAN_LINES = 500
+# Lines advance() scans per call, about 10 ms of Python source
+LINE_STATE_SCAN_STEP_LINES = 1000
+
+
+class LineStates:
+    """
+    Start state of each line of a Buffer for tokenize_line, so multi-line constructs are
+    highlighted on every line they span. States are found by scanning forward from the
+    last line known to be right. After an edit only the lines from the edit on are
+    rescanned, and the scan stops at the first line past the edit whose start state comes
+    out the same as before; the states after it still hold.
+
+    Every scanned line's state is kept, so each scan resumes where the last one stopped.
+    Lines far past that point (a jump to the end of a big file) get a provisional None
+    state at first, and advance() scans toward them a step at a time while the editor
+    is idle.
+    """
+
+    def __init__(self):
+        self.rules = None
+        self._buffer = None
+        self._openers = ()      # Patterns of rules that can leave a construct open
+        self._states = [None]   # Start state of lines scanned so far (line 0 always starts outside)
+        self._valid = 1         # _states[:_valid] are correct
+        self._clean_from = 1    # _states[_clean_from:] were scanned in one go over lines unchanged since,
+                                # they hold again once the line before comes out with its old end state
+        self._line_count = 0    # Buffer line count when changes were last taken
+        self._target = -1       # Furthest line start_state answered provisionally
+
+    def sync(self, buffer, rules):
+        """Catches up with edits made to buffer since the last call; starts over for another buffer or rules."""
+        changed = buffer.take_changed_lines()
+        if buffer is not self._buffer or rules is not self.rules:
+            self._buffer = buffer
+            self.rules = rules
+            self._openers = _openers(rules)
+            self._states = [None]
+            self._valid = self._clean_from = 1
+            self._line_count = buffer.get_line_count()
+            self._target = -1
+            return
+        if changed is None:
+            return
+
+        first_line, unchanged_tail = changed
+        old_count, new_count = self._line_count, buffer.get_line_count()
+        self._line_count = new_count
+        delta = new_count - old_count
+        states = self._states
+
+        # Lines up to first_line keep their start state, the unchanged tail keeps its states shifted by delta
+        tail_start = max(new_count - unchanged_tail, first_line + 1)
+        old_tail_start = tail_start - delta
+        if old_tail_start < len(states):
+            # The tail can be trusted as one chain unless it holds unchecked states from an earlier edit
+            tail_clean = self._valid >= len(states) or self._clean_from <= old_tail_start
+            states[first_line + 1:] = [None] * (tail_start - first_line - 1) + states[old_tail_start:]
+            self._clean_from = tail_start if tail_clean else self._clean_from + delta
+        else:
+            del states[first_line + 1:]
+            self._clean_from = len(states)
+        del states[max(new_count, 1):] # A deletion at the end can leave first_line past the last line
+        self._valid = min(self._valid, first_line + 1, len(states))
+        self._clean_from = min(self._clean_from, len(states))
+        if self._target > first_line:
+            self._target += delta
+        self._target = min(self._target, new_count - 1) # Deleted lines aren't waiting for a state
+
+    @property
+    def pending(self):
+        """True while some line has only a provisional state, see advance()."""
+        return self.rules is not None and self._target >= self._valid
+
+    def start_state(self, line_num):
+        """
+        Start state of line_num, scanning any lines before it not known yet. If that's more
+        than LINE_STATE_SYNC_SCAN_LINES lines, returns None for now and marks the line for advance().
+        """
+        if self.rules is None or not 0 <= line_num < self._buffer.get_line_count():
+            return None
+        if line_num - self._valid >= LINE_STATE_SYNC_SCAN_LINES:
+            self._target = max(self._target, line_num)
+            return None
+        self._scan(line_num + 1)
+        return self._states[line_num]
+
+    def advance(self, max_lines=LINE_STATE_SCAN_STEP_LINES):
+        """
+        Scans up to max_lines toward the furthest line start_state answered provisionally,
+        catching up with buffer edits first. Returns True when that line's state has just
+        become known, rows drawn with provisional states then need redrawing.
+        """
+        if not self.pending:
+            return False
+        self.sync(self._buffer, self.rules)
+        self._scan(min(self._target + 1, self._valid + max_lines))
+        return not self.pending
+
+    def _scan(self, end):
+        """Finds the start states of lines up to end (exclusive)."""
+        end = min(end, self._buffer.get_line_count())
+        states = self._states
+        while self._valid < end:
+            prev = self._valid - 1
+            end_state = line_end_state(self._buffer.get_line(prev) or "", self.rules, states[prev], self._openers)
+            if self._valid < len(states):
+                if self._valid >= self._clean_from and states[self._valid] == end_state:
+                    self._valid = len(states) # Back in step with the old scan, the rest still holds
+                    continue
+                states[self._valid] = end_state
+            else:
+                states.append(end_state)
+            self._valid += 1
+        self._clean_from = max(self._clean_from, self._valid)
+
+
+def _openers(rules):
+    """Patterns of the rules that can leave a construct open at the end of a line."""
+    return tuple(pattern for _, pattern in rules or () if pattern in LINE_CONTINUATIONS)
+
+def line_end_state(line_text, rules, state, openers):
+    """
+    tokenize_line's end state, skipping the tokenizing when no construct can open or close.
+    openers are the patterns of rules found in LINE_CONTINUATIONS.
+    """
+    current_pos = 0
+    if state is not None:
+        match = state[1].match(line_text)
+        if match is None:
+            return state
+        current_pos = match.end()
+    if not any(pattern.search(line_text, current_pos) for pattern in openers):
+        return None
+    return tokenize_line(line_text, rules, state)[1]
+
+
+def _new_packed(line_text):
+    # Offsets fit in 16 bits on all but absurdly long lines
+    return array('H' if len(line_text) <= 0xFFFF else 'I'), array('B')
+
+def _append_token(packed, start, token_type):
+    packed[0].append(start)
+    packed[1].append(TOKEN_TYPE_IDS.get(token_type, 0))
+
+def pack_tokens(tokens):
+    """
+    Packs (token_type, text_segment) tuples the way tokenize_line returns tokens: parallel
+    arrays of start offsets ('H', or 'I' past 64K characters) and token type ids ('B')
+    indexing TOKEN_TYPES. A few dozen bytes per line instead of a tuple and a substring
+    per token; unpack_tokens and iter_tokens read them back given the line's text.
+    """
+    packed = _new_packed("".join(text for _, text in tokens))
+    pos = 0
+    for token_type, text in tokens:
+        _append_token(packed, pos, token_type)
+        pos += len(text)
+    return packed
+
+def iter_tokens(line_text, packed):
+    """Yields (start, end, token_type_id) of packed tokens of line_text."""
+    starts, type_ids = packed
+    last = len(starts) - 1
+    for i, start in enumerate(starts):
+        yield start, starts[i + 1] if i < last else len(line_text), type_ids[i]
+
+def unpack_tokens(line_text, packed):
+    """Packed tokens back as (token_type, text_segment) tuples."""
+    return [(TOKEN_TYPES[type_id], line_text[start:end]) for start, end, type_id in iter_tokens(line_text, packed)]
+
+
+# Lines per task sent to a worker process, and the smallest buffer worth starting workers for
+BULK_CHUNK_LINES = 2000
+BULK_MIN_LINES = 10000
+
+def _highlight_chunk(lines, rules, state, continuations=None):
+    """
+    Worker process task: packed tokens of consecutive lines, the first one starting in state.
+    continuations are the LINE_CONTINUATIONS entries of rules, a fresh worker has none.
+    """
+    if continuations:
+        LINE_CONTINUATIONS.update(continuations)
+    packed = []
+    for line_text in lines:
+        tokens, state = _tokenize_line(line_text, rules, state) # The token cache is per process, skip it
+        packed.append(tokens)
+    return packed
+
+
+class BulkHighlighter:
+    """
+    Tokenizes whole buffers for whole-file work (outlines, searching by token type, exports),
+    spreading chunks of lines over a process pool and returning pack_tokens() arrays, one
+    pair per line. Each chunk's start state comes from a quick serial scan, so strings
+    spanning chunks come out right. The last result is kept until the buffer changes.
+    Buffers under BULK_MIN_LINES are tokenized in this process, starting workers would
+    cost more than it saves.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._pool = None      # Started on first big buffer
+        self._cached_for = None # (buffer id, version, line count, rules id) of _cached
+        self._cached = None
+
+    def highlight_buffer(self, buffer, rules):
+        """Packed tokens of every line of buffer, blocking until they're all done."""
+        cache_key = (id(buffer), buffer.version, buffer.get_line_count(), id(rules))
+        if cache_key == self._cached_for:
+            return self._cached
+
+        lines = list(buffer.lines)
+        if not rules:
+            packed = [pack_tokens([(TOKEN_TYPE_DEFAULT, line_text)]) for line_text in lines]
+        elif len(lines) < BULK_MIN_LINES:
+            packed = _highlight_chunk(lines, rules, None)
+        else:
+            packed = self._highlight_in_pool(lines, rules)
+
+        self._cached_for = cache_key
+        self._cached = packed
+        return packed
+
+    def _highlight_in_pool(self, lines, rules):
+        chunk_states = []
+        openers = _openers(rules)
+        continuations = {pattern: LINE_CONTINUATIONS[pattern] for pattern in openers}
+        state = None
+        for i, line_text in enumerate(lines):
+            if i % BULK_CHUNK_LINES == 0:
+                chunk_states.append(state)
+            state = line_end_state(line_text, rules, state, openers)
+
+        try:
+            if self._pool is None:
+                # Imported here, they take a while and most sessions never start a pool
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Spawned, not forked: the editor process has GL state and threads holding locks
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            futures = [self._pool.submit(_highlight_chunk, lines[i * BULK_CHUNK_LINES:(i + 1) * BULK_CHUNK_LINES],
+                                         rules, chunk_state, continuations)
+                       for i, chunk_state in enumerate(chunk_states)]
+            packed = []
+            for future in futures:
+                packed.extend(future.result())
+            return packed
+        except Exception as e:
+            print(f"Error highlighting in worker processes, highlighting here instead: {e}")
+            return _highlight_chunk(lines, rules, None)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self._cached_for = self._cached = None